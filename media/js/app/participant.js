@@ -1,5 +1,5 @@
 /* global Backbone: true, _: true, alert: true, YT: true, onPlayerReady: true */
-/* global onPlayerStateChange: true */
+/* global onPlayerStateChange: true, getCookie: true */
 
 (function() {
     window.ParticipantPageView = Backbone.View.extend({
@@ -15,10 +15,18 @@
                 'onPlayerStateChange', 'onYouTubeIframeAPIReady',
                 'onClickDisabled', 'onClickBack',
                 'isWatching', 'onSubmitPage', 'isFormComplete',
-                'recordSecondsViewed');
+                'recordSecondsViewed', 'onTick', 'sendIntervals',
+                'onPageHide');
 
             this.participant_id = options.participant_id;
 
+            // viewing intervals not yet delivered to the server
+            this.intervals = [];
+
+            // deliver the last partial interval when the page is closed
+            // eslint-disable-next-line scanjs-rules/call_addEventListener
+            window.addEventListener('pagehide', this.onPageHide);
+
             // load the youtube iframe api
             window.onYouTubeIframeAPIReady = this.onYouTubeIframeAPIReady;
             window.onPlayerReady = this.onPlayerReady;
@@ -72,13 +80,14 @@
                 clearInterval(this.timer);
                 delete this.timer;
                 this.recordSecondsViewed();
+                this.sendIntervals();
                 break;
             case YT.PlayerState.PLAYING:
                 jQuery('a, .nav li').attr('disabled', 'disabled');
                 this._start = new Date().getTime();
+                this._position = this.player.getCurrentTime();
                 // eslint-disable-next-line scanjs-rules/call_setInterval
-                this.timer = setInterval(this.recordSecondsViewed, 5000);
-                    
+                this.timer = setInterval(this.onTick, 5000);
                 break;
             }
         },
@@ -99,32 +108,70 @@
             });
         },
         recordSecondsViewed: function() {
-            var self = this;
             if (this._start !== undefined) {
                 var end = new Date().getTime();
                 var seconds_viewed = (end - this._start) / 1000;
+                var position = this.player.getCurrentTime();
 
-                return jQuery.ajax({
-                    type: 'post',
-                    url: '/track/',
-                    data: {
-                        video_id: this.video_id,
-                        video_duration: Math.round(this.video_duration),
-                        seconds_viewed: Math.round(seconds_viewed)
-                    },
-                    success: function() {
-                        if (self.player.getPlayerState() === 1) {
-                            self._start = new Date().getTime();
-                        } else {
-                            delete self._start;
-                            jQuery('a, .nav li').removeAttr('disabled');
-                        }
-                    },
-                    error: function() {
-                        this.player.stop();
-                        alert('An error occurred.');
-                    }
+                // start & end are the player positions, used to record
+                // which seconds of the video were watched
+                this.intervals.push({
+                    video_id: this.video_id,
+                    video_duration: Math.round(this.video_duration),
+                    seconds_viewed: Math.round(seconds_viewed),
+                    start: this._position,
+                    end: position
                 });
+
+                if (this.player.getPlayerState() === 1) {
+                    this._start = end;
+                    this._position = position;
+                } else {
+                    delete this._start;
+                    delete this._position;
+                }
+            }
+        },
+        onTick: function() {
+            // queue an interval every 5 seconds, deliver every 30 seconds
+            this.recordSecondsViewed();
+            if (this.intervals.length >= 6) {
+                this.sendIntervals();
+            }
+        },
+        sendIntervals: function() {
+            var self = this;
+            var intervals = this.intervals;
+            this.intervals = [];
+
+            return jQuery.ajax({
+                type: 'post',
+                url: '/track/batch/',
+                data: {
+                    intervals: JSON.stringify(intervals)
+                },
+                success: function() {
+                    if (self.player.getPlayerState() !== 1) {
+                        jQuery('a, .nav li').removeAttr('disabled');
+                    }
+                },
+                error: function() {
+                    // retry with the next delivery
+                    self.intervals = intervals.concat(self.intervals);
+                    self.player.stopVideo();
+                    alert('An error occurred.');
+                }
+            });
+        },
+        onPageHide: function() {
+            this.recordSecondsViewed();
+            if (this.intervals.length > 0 && navigator.sendBeacon) {
+                var data = new FormData();
+                data.append('csrfmiddlewaretoken', getCookie('csrftoken'));
+                data.append('intervals', JSON.stringify(this.intervals));
+                if (navigator.sendBeacon('/track/batch/', data)) {
+                    this.intervals = [];
+                }
             }
         }
     });
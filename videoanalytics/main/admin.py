@@ -1,5 +1,6 @@
 from django.contrib import admin
-from videoanalytics.main.models import UserProfile, UserVideoView
+from videoanalytics.main.models import ReportJob, UserProfile, \
+    UserVideoView
 from pagetree.models import Hierarchy, UserLocation, UserPageVisit
 
 admin.site.register(Hierarchy)
@@ -22,7 +23,8 @@ class UserVideoViewAdmin(admin.ModelAdmin):
         model = UserVideoView
 
     search_fields = ("user__username",)
-    list_display = ("user", "video_id", "video_duration", "seconds_viewed")
+    list_display = ("user", "video_id", "video_duration", "seconds_viewed",
+                    "unique_seconds")
 
 
 admin.site.register(UserVideoView, UserVideoViewAdmin)
@@ -37,3 +39,15 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 
 admin.site.register(UserProfile, UserProfileAdmin)
+
+
+class ReportJobAdmin(admin.ModelAdmin):
+    class Meta:
+        model = ReportJob
+
+    list_display = ("report_type", "status", "requested_by", "created",
+                    "finished", "rows_written")
+    list_filter = ("status", "report_type")
+
+
+admin.site.register(ReportJob, ReportJobAdmin)
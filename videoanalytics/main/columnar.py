@@ -0,0 +1,79 @@
+'''The VideoAnalyticsReport values as a compressed NumPy .npz archive with
+one typed array per column, keyed by the column identifiers of the csv
+header, for loading into pandas or R without parsing text.
+
+Column types follow the item type in the report's metadata:
+  percent          int64
+  percent viewed   float64
+  # correct        float64, NaN when there is no score
+  date string      datetime64[us] in UTC, NaT when the user has no visits
+  anything else    unicode strings, as written to the csv
+
+The archive also holds the column identifiers in report order under
+COLUMNS_KEY.'''
+
+import numpy as np
+from django.utils import timezone
+from django.utils.encoding import smart_text
+
+
+COLUMNS_KEY = '__columns__'
+
+COLUMN_TYPES = {
+    'percent': 'int',
+    'percent viewed': 'float',
+    '# correct': 'float',
+    'date string': 'datetime',
+}
+
+
+def column_type(column):
+    return COLUMN_TYPES.get(column.metadata()[3], 'string')
+
+
+def as_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def as_datetime64(value):
+    if value is None or value == '':
+        return np.datetime64('NaT', 'us')
+    return np.datetime64(timezone.make_naive(value, timezone.utc), 'us')
+
+
+def typed_array(kind, values):
+    if kind == 'int':
+        return np.array(values, dtype=np.int64)
+    if kind == 'float':
+        return np.array([as_float(v) for v in values], dtype=np.float64)
+    if kind == 'datetime':
+        return np.array([as_datetime64(v) for v in values],
+                        dtype='datetime64[us]')
+    return np.array(['' if v is None else smart_text(v) for v in values],
+                    dtype=np.unicode_)
+
+
+def report_arrays(report, hierarchies):
+    '''{column identifier: array} for the report's users in id order'''
+    columns = report.value_columns(hierarchies)
+    identifiers = report.value_headers(columns)
+    values = [[] for column in columns]
+
+    for chunk in report.user_chunks():
+        for user in chunk.users:
+            for i, column in enumerate(columns):
+                values[i].append(chunk.typed_value(column, user))
+        chunk.memo.release(chunk.user_ids)
+
+    arrays = dict(
+        (identifier, typed_array(column_type(column), column_values))
+        for identifier, column, column_values in zip(identifiers, columns,
+                                                     values))
+    arrays[COLUMNS_KEY] = np.array(identifiers, dtype=np.unicode_)
+    return arrays
+
+
+def write_npz(fh, report, hierarchies):
+    np.savez_compressed(fh, **report_arrays(report, hierarchies))
@@ -0,0 +1,55 @@
+'''Per-second viewing coverage of a video, stored as a bitset with one bit
+per second of the video. Second n is bit 7 - (n % 8) of byte n // 8, the
+most-significant-bit-first layout numpy.unpackbits expects. A two hour
+video needs 900 bytes.'''
+
+BIT_COUNTS = [bin(i).count('1') for i in range(256)]
+
+
+def mark_seconds(bitmap, start, end):
+    '''Set the bits for seconds start through end - 1. Returns the new
+    bitmap and how many of those seconds were not already set.'''
+    bits = bytearray(bitmap)
+    if end <= start:
+        return bytes(bits), 0
+
+    needed = (end + 7) // 8
+    if len(bits) < needed:
+        bits.extend(bytearray(needed - len(bits)))
+
+    # whole bytes are filled as a slice, only the first and last are masked
+    first, last = start // 8, (end - 1) // 8
+    before = count_seconds(bits[first:last + 1])
+
+    head = 0xff >> (start % 8)
+    tail = (0xff << (7 - (end - 1) % 8)) & 0xff
+    if first == last:
+        bits[first] |= head & tail
+    else:
+        bits[first] |= head
+        bits[first + 1:last] = b'\xff' * (last - first - 1)
+        bits[last] |= tail
+
+    return bytes(bits), count_seconds(bits[first:last + 1]) - before
+
+
+def count_seconds(bitmap):
+    return sum(BIT_COUNTS[b] for b in bytearray(bitmap))
+
+
+def watched_intervals(bitmap):
+    '''The watched seconds as a list of [start, end) runs'''
+    runs = []
+    start = None
+    bits = bytearray(bitmap)
+    for second in range(len(bits) * 8):
+        watched = bits[second // 8] & (0x80 >> (second % 8))
+        if watched and start is None:
+            start = second
+        elif not watched and start is not None:
+            runs.append((start, second))
+            start = None
+
+    if start is not None:
+        runs.append((start, len(bits) * 8))
+    return runs
@@ -0,0 +1,151 @@
+'''Writes the VideoAnalyticsReport values csv, optionally using several
+processes. The ordered users are split into contiguous id ranges, each
+range's rows are written to a file by a worker with its own database
+connection, and the files are concatenated in id order. The output is
+identical to the ReportView download. One process, writing the rows
+directly, is the default.
+
+merge_delta applies a delta export to an earlier snapshot. The rows of
+participants inactive since the snapshot are kept as they were, so the
+course content must not have changed in between: a page added or removed
+changes every participant's percent complete. A snapshot records the
+content version it was exported at for check_content_version.'''
+
+import csv
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils import six
+from django.utils.encoding import smart_text
+from pagetree.models import Hierarchy
+
+from videoanalytics.main.models import VideoAnalyticsReport
+from videoanalytics.main.structure import all_hierarchies, \
+    structure_version
+
+
+def open_csv(path, mode='r'):
+    '''a file for the csv module: binary on Python 2, text without newline
+    translation on Python 3'''
+    if six.PY2:
+        return open(path, mode + 'b')
+    return io.open(path, mode, newline='')
+
+
+def user_shards(user_ids, count):
+    '''split the ordered user ids into up to count (first, last) ranges'''
+    size = max(1, -(-len(user_ids) // max(count, 1)))
+    return [(user_ids[i], user_ids[min(i + size, len(user_ids)) - 1])
+            for i in range(0, len(user_ids), size)]
+
+
+def write_shard(task):
+    hierarchy_ids, first_id, last_id, path = task
+    hierarchies = Hierarchy.objects.in_bulk(hierarchy_ids)
+
+    report = VideoAnalyticsReport()
+    columns = report.value_columns([hierarchies[i] for i in hierarchy_ids])
+    users = report.users().filter(id__gte=first_id, id__lte=last_id)
+
+    with open_csv(path, 'w') as fh:
+        writer = csv.writer(fh)
+        for row in report.user_rows(columns, users):
+            writer.writerow(row)
+
+
+def write_shards(tasks, jobs):
+    if jobs < 2:
+        for task in tasks:
+            write_shard(task)
+        return
+
+    # forked workers must open their own connections
+    connections.close_all()
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pool.map(write_shard, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def export_values(fh, jobs=1, shards=None):
+    '''write the values csv to fh, computing shards (by default one per
+    job) in jobs processes. A single job without shards writes the rows
+    directly.'''
+    report = VideoAnalyticsReport()
+    hierarchies = all_hierarchies()
+    columns = report.value_columns(hierarchies)
+    writer = csv.writer(fh)
+    writer.writerow(report.value_headers(columns))
+
+    if jobs < 2 and shards is None:
+        writer.writerows(report.user_rows(columns, report.users()))
+        return
+
+    user_ids = list(report.users().values_list('id', flat=True))
+    hierarchy_ids = [h.id for h in hierarchies]
+
+    directory = tempfile.mkdtemp()
+    try:
+        tasks = [(hierarchy_ids, first, last,
+                  os.path.join(directory, '%d.csv' % i))
+                 for i, (first, last) in enumerate(
+                     user_shards(user_ids, shards or jobs))]
+        write_shards(tasks, jobs)
+
+        for task in tasks:
+            with open_csv(task[3]) as shard:
+                shutil.copyfileobj(shard, fh)
+    finally:
+        shutil.rmtree(directory)
+
+
+def parse_watermark(value):
+    '''the ISO 8601 timestamp a delta export starts from'''
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValueError('Invalid timestamp %s' % value)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def check_content_version(version):
+    '''ValueError unless the course content is still at the version a
+    snapshot was exported at'''
+    if version != structure_version():
+        raise ValueError('The course content changed since the snapshot. '
+                         'Export the full report instead.')
+
+
+def merge_delta(snapshot, delta):
+    '''The full values report from the rows of a snapshot and of a
+    delta_values export taken since it. Rows are matched on participant
+    id. Participants new since the snapshot follow the rest, as they do in
+    the report's user id order.'''
+    snapshot = iter(snapshot)
+    delta = iter(delta)
+
+    header = next(snapshot)
+    if [smart_text(c) for c in next(delta)] != header:
+        raise ValueError('The report columns changed since the snapshot. '
+                         'Export the full report instead.')
+
+    changed = OrderedDict((smart_text(row[0]), row) for row in delta)
+
+    yield header
+    for row in snapshot:
+        yield changed.pop(row[0], row)
+    for row in changed.values():
+        yield row
@@ -0,0 +1,107 @@
+'''Builds queued ReportJobs. The jobs table is the queue: the
+run_report_jobs worker claims the oldest queued job with a conditional
+UPDATE, so several workers can share it without an external broker.
+A job still running STALE_SECONDS after it started is taken to have lost
+its worker and is marked failed, so the report can be queued again.'''
+
+import csv
+import os
+import traceback
+from datetime import timedelta
+
+from django.utils import timezone
+
+from videoanalytics.main.export import open_csv
+from videoanalytics.main.models import ReportJob, VideoAnalyticsReport, \
+    report_storage
+from videoanalytics.main.structure import all_hierarchies
+
+
+# rows written between progress updates
+PROGRESS_ROWS = 500
+
+# longer than any export takes
+STALE_SECONDS = 2 * 60 * 60
+
+
+def fail_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=STALE_SECONDS)
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started__lt=cutoff).update(
+        status=ReportJob.FAILED, finished=timezone.now(),
+        error='The worker stopped before the report was finished.')
+
+
+def claim_job():
+    '''the oldest queued job, now marked running, or None'''
+    queued = ReportJob.objects.filter(status=ReportJob.QUEUED)
+    for job_id in queued.order_by('created').values_list('id', flat=True):
+        claimed = ReportJob.objects.filter(
+            id=job_id, status=ReportJob.QUEUED).update(
+            status=ReportJob.RUNNING, started=timezone.now())
+        if claimed:
+            return ReportJob.objects.get(id=job_id)
+    return None
+
+
+def report_rows(report_type):
+    '''(rows, expected row count, 0 if unknown)'''
+    report = VideoAnalyticsReport()
+    hierarchies = all_hierarchies()
+    if report_type == 'values':
+        return report.values(hierarchies), report.users().count() + 1
+    return report.metadata(hierarchies), 0
+
+
+def write_rows(job, rows, fh):
+    writer = csv.writer(fh)
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        if written % PROGRESS_ROWS == 0:
+            ReportJob.objects.filter(id=job.id).update(rows_written=written)
+    return written
+
+
+def build_artifact(job):
+    rows, total = report_rows(job.report_type)
+    ReportJob.objects.filter(id=job.id).update(rows_total=total)
+
+    name = report_storage.get_available_name(
+        os.path.join('reports', '%d_%s' % (job.id, job.filename())))
+    path = report_storage.path(name)
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    # written under a temporary name, the file is never seen partial
+    try:
+        with open_csv(path + '.tmp', 'w') as fh:
+            written = write_rows(job, rows, fh)
+        os.rename(path + '.tmp', path)
+    finally:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+
+    return name, written
+
+
+def run_job(job):
+    '''Builds the job's report. Returns False if fail_stale_jobs gave the
+    job up meanwhile: its report may have been queued again, so the job
+    is left failed and the artifact discarded.'''
+    running = ReportJob.objects.filter(id=job.id, status=ReportJob.RUNNING)
+    try:
+        name, written = build_artifact(job)
+    except Exception:
+        running.update(
+            status=ReportJob.FAILED, finished=timezone.now(),
+            error=traceback.format_exc())
+        raise
+
+    if not running.update(
+            status=ReportJob.COMPLETE, finished=timezone.now(),
+            artifact=name, rows_written=written, rows_total=written):
+        report_storage.delete(name)
+        return False
+    return True
@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from videoanalytics.main.models import UserVideoView
+
+
+def legacy_record_view(user_id, video_id, video_duration, seconds_viewed):
+    # the read-modify-write TrackVideoView.post used previously
+    uvv = UserVideoView.objects.get_or_create(user_id=user_id,
+                                              video_id=video_id)
+    uvv[0].video_duration = video_duration
+    uvv[0].seconds_viewed += seconds_viewed
+    uvv[0].save()
+
+
+class Command(BaseCommand):
+    help = ('Measure TrackVideoView heartbeat writes per second for the '
+            'legacy get_or_create path and UserVideoView.record_view. '
+            'Everything written is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--heartbeats', type=int, default=2000,
+                            help='heartbeats per run')
+        parser.add_argument('--videos', type=int, default=10,
+                            help='distinct video ids the heartbeats cycle')
+
+    def run(self, record, user_id, heartbeats, videos):
+        start = time.time()
+        for i in range(heartbeats):
+            record(user_id, 'benchmark-%d' % (i % videos), 300, 5)
+        return heartbeats / (time.time() - start)
+
+    def handle(self, *args, **options):
+        heartbeats = options['heartbeats']
+        videos = options['videos']
+
+        with transaction.atomic():
+            user = User.objects.create_user('heartbeat-benchmark')
+
+            legacy = self.run(legacy_record_view, user.id,
+                              heartbeats, videos)
+            UserVideoView.objects.filter(user=user).delete()
+            upsert = self.run(UserVideoView.record_view, user.id,
+                              heartbeats, videos)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write('get_or_create + save: %8.1f heartbeats/sec' %
+                          legacy)
+        self.stdout.write('record_view:          %8.1f heartbeats/sec' %
+                          upsert)
+        self.stdout.write('speedup:              %8.2fx' % (upsert / legacy))
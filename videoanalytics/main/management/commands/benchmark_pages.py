@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from videoanalytics.main.pagebudget import PAGE_QUERY_BUDGETS, \
+    QUESTIONS, TOPIC_PAGES, VIDEO_PAGES, build_course, course_pages, \
+    measure_pages
+
+
+class Command(BaseCommand):
+    help = ('Measure the queries and time of each participant page type '
+            'on a generated course, and fail when a page takes more '
+            'queries than its budget. Everything written is rolled back, '
+            'so run it against an empty database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topic-pages', type=int, default=TOPIC_PAGES,
+                            help='topic pages in hierarchies a and b')
+        parser.add_argument('--video-pages', type=int, default=VIDEO_PAGES,
+                            help='pages in the videos hierarchy')
+        parser.add_argument('--questions', type=int, default=QUESTIONS,
+                            help='questions per quiz')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='requests per page, the median time is '
+                            'reported')
+
+    def is_default_course(self, options):
+        return (options['topic_pages'] == TOPIC_PAGES and
+                options['video_pages'] == VIDEO_PAGES and
+                options['questions'] == QUESTIONS)
+
+    def handle(self, *args, **options):
+        pages = course_pages(options['topic_pages'], options['video_pages'])
+
+        with transaction.atomic(), \
+                override_settings(ALLOWED_HOSTS=['testserver']):
+            build_course(options['topic_pages'], options['video_pages'],
+                         options['questions'])
+            results = measure_pages(pages, options['repeat'])
+            transaction.set_rollback(True)
+
+        # the budgets hold for the default course only
+        check = self.is_default_course(options)
+
+        over = []
+        self.stdout.write('%-14s %8s %8s %10s' % (
+            'page', 'queries', 'budget', 'ms'))
+        for page_type, queries, seconds in results:
+            budget = PAGE_QUERY_BUDGETS[page_type] if check else '-'
+            self.stdout.write('%-14s %8d %8s %10.1f' % (
+                page_type, queries, budget, seconds * 1000))
+            if check and queries > budget:
+                over.append(page_type)
+
+        if len(over) > 0:
+            raise CommandError('Over the query budget: %s' % ', '.join(over))
@@ -0,0 +1,103 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from videoanalytics.main.columnar import write_npz
+from videoanalytics.main.export import check_content_version, \
+    export_values, merge_delta, open_csv, parse_watermark
+from videoanalytics.main.models import VideoAnalyticsReport
+from videoanalytics.main.structure import all_hierarchies, \
+    structure_version
+
+
+class Command(BaseCommand):
+    help = ('Write the report keys or values csv, computing the values '
+            'in parallel processes or only for recently active users')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', default='values',
+                            choices=['key', 'values'])
+        parser.add_argument('--jobs', type=int, default=1,
+                            help='processes computing the values rows. '
+                            'Off by default: no speedup has been measured, '
+                            'try it on a multi-core PostgreSQL host')
+        parser.add_argument('--output', default=None,
+                            help='file to write, standard output if unset')
+        parser.add_argument('--since', default=None,
+                            help='only the values of users active after '
+                            'this ISO 8601 timestamp')
+        parser.add_argument('--snapshot', default=None,
+                            help='values csv exported at --since. The '
+                            'delta is merged into it, writing a full report')
+        parser.add_argument('--content-version', default=None,
+                            help='course content version the snapshot was '
+                            'exported at, the merge is refused if it changed')
+        parser.add_argument('--format', default='csv',
+                            choices=['csv', 'npz'],
+                            help='npz writes the values as typed NumPy '
+                            'arrays, it requires --output')
+
+    def export_delta(self, fh, options):
+        try:
+            since = parse_watermark(options['since'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = VideoAnalyticsReport()
+        rows = report.delta_values(all_hierarchies(), since)
+        writer = csv.writer(fh)
+        if options['snapshot'] is None:
+            writer.writerows(rows)
+            return
+
+        with open_csv(options['snapshot']) as snapshot:
+            try:
+                check_content_version(options['content_version'])
+                writer.writerows(merge_delta(csv.reader(snapshot), rows))
+            except ValueError as e:
+                raise CommandError(str(e))
+
+    def export(self, fh, options):
+        if options['type'] == 'key':
+            writer = csv.writer(fh)
+            report = VideoAnalyticsReport()
+            for row in report.metadata(all_hierarchies()):
+                writer.writerow(row)
+        elif options['since']:
+            self.export_delta(fh, options)
+        else:
+            export_values(fh, jobs=options['jobs'])
+
+    def check_options(self, options):
+        if options['snapshot'] and not (
+                options['since'] and options['content_version']):
+            raise CommandError(
+                '--snapshot requires --since and --content-version')
+        if options['format'] == 'npz' and (
+                options['type'] != 'values' or options['since'] or
+                not options['output']):
+            raise CommandError('npz is written for full values reports '
+                               'to an --output file')
+
+    def handle(self, *args, **options):
+        self.check_options(options)
+
+        start = time.time()
+        watermark = timezone.now()
+        version = structure_version()
+        if options['format'] == 'npz':
+            with open(options['output'], 'wb') as fh:
+                write_npz(fh, VideoAnalyticsReport(), all_hierarchies())
+        elif options['output']:
+            with open_csv(options['output'], 'w') as fh:
+                self.export(fh, options)
+        else:
+            self.export(sys.stdout, options)
+
+        self.stderr.write('%s report written in %.2fs with %d jobs' % (
+            options['type'], time.time() - start, options['jobs']))
+        self.stderr.write('next --since %s --content-version %s' % (
+            watermark.isoformat(), version))
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from videoanalytics.main.models import CONTROL_GROUP, QuizTopicScore
+
+
+class Command(BaseCommand):
+    help = ('Backfill the QuizTopicScore table for participants with quiz '
+            'submissions, or --check it against the live computation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', default=False,
+                            help='compare stored scores, writing nothing. '
+                            'Missing or stale scores count as mismatches')
+
+    def participants(self):
+        return User.objects.filter(submission__isnull=False).exclude(
+            profile__research_group=CONTROL_GROUP).select_related(
+            'profile').distinct().order_by('id')
+
+    def check(self, user, hierarchy):
+        '''None if the stored scores are current and match the live
+        computation, otherwise what is wrong with them'''
+        rows = list(QuizTopicScore.objects.filter(
+            user=user, hierarchy=hierarchy))
+        if len(rows) == 0:
+            return 'missing'
+        elif any(row.stale for row in rows):
+            return 'stale'
+        elif (QuizTopicScore.from_rows(rows) !=
+                QuizTopicScore.summarize(user, hierarchy)):
+            return 'mismatch'
+        return None
+
+    def handle(self, *args, **options):
+        mismatched = 0
+        count = 0
+        for user in self.participants():
+            hierarchy = user.profile.default_hierarchy()
+            problem = None
+            if not options['check']:
+                QuizTopicScore.refresh(user, hierarchy)
+            else:
+                problem = self.check(user, hierarchy)
+            if problem is not None:
+                mismatched += 1
+                self.stdout.write('%s: %s in %s' % (
+                    problem, user.username, hierarchy.name))
+            count += 1
+
+        if options['check'] and mismatched > 0:
+            raise CommandError('%d of %d participants have missing, stale '
+                               'or mismatched scores' % (mismatched, count))
+
+        verb = 'checked' if options['check'] else 'refreshed'
+        self.stdout.write('%s %d participants' % (verb, count))
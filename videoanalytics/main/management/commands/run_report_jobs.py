@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from videoanalytics.main.jobs import claim_job, run_job
+
+
+class Command(BaseCommand):
+    help = 'Build queued report exports, polling for new jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', default=False,
+                            help='exit when the queue is empty')
+        parser.add_argument('--poll', type=float, default=5,
+                            help='seconds between checks for new jobs')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+
+            self.build(job)
+
+    def build(self, job):
+        self.stdout.write(
+            'building %s report %d' % (job.report_type, job.id))
+        try:
+            if not run_job(job):
+                self.stderr.write('report %d was failed as stale before '
+                                  'it finished' % job.id)
+        except Exception as e:
+            # recorded on the job, keep serving the queue
+            self.stderr.write('report %d failed: %s' % (job.id, e))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_userprofile_research_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uservideoview',
+            name='coverage',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.AddField(
+            model_name='uservideoview',
+            name='unique_seconds',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 16:53
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagetree', '0002_delete_testblock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0003_uservideoview_coverage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizTopicScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinality', models.PositiveIntegerField(default=0)),
+                ('topic', models.TextField(blank=True, null=True)),
+                ('explanation', models.TextField(blank=True)),
+                ('score', models.IntegerField(default=0)),
+                ('passed', models.IntegerField(default=0)),
+                ('stale', models.BooleanField(default=False)),
+                ('hierarchy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pagetree.Hierarchy')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('ordinality',),
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='quiztopicscore',
+            index_together=set([('user', 'hierarchy')]),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 17:01
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0004_quiztopicscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('key', 'Report Keys'), ('values', 'Report Values')], max_length=10)),
+                ('status', models.CharField(db_index=True, default='queued', max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('rows_total', models.IntegerField(default=0)),
+                ('rows_written', models.IntegerField(default=0)),
+                ('artifact', models.FileField(blank=True, upload_to='reports')),
+                ('error', models.TextField(blank=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created',),
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 17:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import videoanalytics.main.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_uservideoview_modified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='artifact',
+            field=models.FileField(blank=True, storage=videoanalytics.main.models.ReportStorage(), upload_to='reports'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# flake8: noqa
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 18:22
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+
+def delete_duplicates(apps, schema_editor):
+    # the scores are recomputed on the next read
+    QuizTopicScore = apps.get_model('main', 'QuizTopicScore')
+    duplicated = QuizTopicScore.objects.values(
+        'user', 'hierarchy', 'topic').annotate(
+        rows=Count('id')).filter(rows__gt=1)
+    for row in duplicated:
+        QuizTopicScore.objects.filter(
+            user=row['user'], hierarchy=row['hierarchy']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pagetree', '0002_delete_testblock'),
+        ('main', '0008_contentversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='quiztopicscore',
+            unique_together=set([('user', 'hierarchy', 'topic')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='quiztopicscore',
+            index_together=set([]),
+        ),
+    ]
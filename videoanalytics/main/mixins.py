@@ -24,11 +24,7 @@ def ajax_required(func):
     return wrap
 
 
-class JSONResponseMixin(object):
-    @method_decorator(ajax_required)
-    def dispatch(self, *args, **kwargs):
-        return super(JSONResponseMixin, self).dispatch(*args, **kwargs)
-
+class JSONRenderMixin(object):
     def render_to_json_response(self, context, **response_kwargs):
         """
         Returns a JSON response, transforming 'context' to make the payload.
@@ -38,6 +34,12 @@ class JSONResponseMixin(object):
                             **response_kwargs)
 
 
+class JSONResponseMixin(JSONRenderMixin):
+    @method_decorator(ajax_required)
+    def dispatch(self, *args, **kwargs):
+        return super(JSONResponseMixin, self).dispatch(*args, **kwargs)
+
+
 class LoggedInMixin(object):
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
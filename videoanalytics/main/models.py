@@ -1,24 +1,51 @@
 from __future__ import unicode_literals
 
+import os
+
 from django import forms
 from django.contrib.auth.models import User
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericRelation
-from django.db import models
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Max, Min, Prefetch, \
+    prefetch_related_objects
 from django.db.models.fields.related import OneToOneField
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
-from django.utils.encoding import python_2_unicode_compatible
-from pagetree.models import Hierarchy, UserPageVisit, PageBlock
+from django.utils.encoding import python_2_unicode_compatible, smart_text
+from pagetree.models import Hierarchy, UserPageVisit, PageBlock, Section
 from pagetree.reports import PagetreeReport, ReportableInterface, \
     StandaloneReportColumn, ReportColumnInterface
-from quizblock.models import Submission
+from quizblock.models import Answer, Question, QuestionColumn, Quiz, \
+    Response, Submission
+from videoanalytics.main.coverage import mark_seconds, watched_intervals
+from videoanalytics.main.structure import clear_hierarchy_metadata, \
+    hierarchy_metadata, versioned
 from videoanalytics.main.templatetags.quizsummary import \
-    get_quizzes_by_css_class, get_quiz_summary_by_category
+    QuizScores, get_quizzes_by_css_class, get_quiz_summary_by_category, \
+    latest_responses
+from videoanalytics.main.unlocks import gate_check, visit_recorded
 
 
 CONTROL_GROUP = 'a'
 DIAGNOSTIC_GROUP = 'b'
 
+# number of users evaluated together by VideoAnalyticsReport.values()
+REPORT_CHUNK_SIZE = 500
+
+# what the blocks' report columns and templates read, loaded along with
+# the blocks
+BLOCK_PREFETCH = {
+    Quiz: ['question_set__answer_set'],
+}
+
+
+class ContentVersion(models.Model):
+    '''The version token of the content caches in main.structure. It is
+    kept in the database, so that every process sees an edit.'''
+    token = models.CharField(max_length=32)
+
 
 class UserProfile(models.Model):
     user = OneToOneField(User, related_name='profile')
@@ -29,40 +56,32 @@ class UserProfile(models.Model):
     def is_participant(self):
         return not self.user.is_active
 
+    def hierarchy_metadata(self):
+        return hierarchy_metadata(self.research_group)
+
     def default_hierarchy(self):
-        return Hierarchy.get_hierarchy(self.research_group)
+        return self.hierarchy_metadata().hierarchy
 
     def in_control_group(self):
         return self.default_hierarchy().name == CONTROL_GROUP
 
     def default_location(self):
-        return self.default_hierarchy().get_root()
+        return self.hierarchy_metadata().root
 
     def first_access_formatted(self):
         upv = UserPageVisit.objects.filter(user=self.user).exclude(
             first_visit__isnull=True).order_by('first_visit').first()
-
-        if upv:
-            dt = timezone.localtime(upv.first_visit)
-            return dt.strftime('%b %d, %Y %H:%M:%S')
-
-        return ''
+        return access_formatted(upv.first_visit if upv else None)
 
     def last_access_formatted(self):
         upv = UserPageVisit.objects.filter(user=self.user).exclude(
             last_visit__isnull=True).order_by('-last_visit').first()
-
-        if upv:
-            dt = timezone.localtime(upv.last_visit)
-            return dt.strftime('%b %d, %Y %H:%M:%S')
-
-        return ''
+        return access_formatted(upv.last_visit if upv else None)
 
     def next_unlocked_section_url(self):
-        hierarchy = Hierarchy.get_hierarchy(self.research_group)
-        last_section = hierarchy.get_last_leaf(hierarchy.get_root())
+        last_section = self.hierarchy_metadata().last_leaf
 
-        (visited, next_section) = last_section.gate_check(self.user)
+        (visited, next_section) = gate_check(self.user, last_section)
 
         if visited:
             return last_section.get_absolute_url()
@@ -71,32 +90,41 @@ class UserProfile(models.Model):
 
     def last_location_url(self):
         if self.percent_complete() == 0:
-            hierarchy = Hierarchy.get_hierarchy(self.research_group)
-            section = hierarchy.get_root().get_first_child()
+            section = self.hierarchy_metadata().first_child
         else:
             section = self.last_location()
 
         return section.get_absolute_url()
 
     def last_location(self):
-        hierarchy = Hierarchy.get_hierarchy(self.research_group)
+        metadata = self.hierarchy_metadata()
         upv = UserPageVisit.objects.filter(
-            user=self.user, section__hierarchy=hierarchy).order_by(
+            user=self.user, section__hierarchy=metadata.hierarchy).order_by(
             '-last_visit')
         if upv.count() < 1:
-            return hierarchy.get_root()
+            return metadata.root
         else:
             return upv[0].section
 
     def percent_complete(self):
-        hierarchy = Hierarchy.get_hierarchy(self.research_group)
-        pages = hierarchy.get_root().get_descendants().count()
+        metadata = self.hierarchy_metadata()
+        pages = metadata.page_count
         visits = UserPageVisit.objects.filter(
-            user=self.user, section__hierarchy=hierarchy).count()
-        if pages > 0:
-            return int(visits / float(pages) * 100)
-        else:
-            return 0
+            user=self.user, section__hierarchy=metadata.hierarchy).count()
+        return percent_of_pages(visits, pages)
+
+
+def access_formatted(dt):
+    if dt is None:
+        return ''
+    return timezone.localtime(dt).strftime('%b %d, %Y %H:%M:%S')
+
+
+def percent_of_pages(visits, pages):
+    if pages > 0:
+        return int(visits / float(pages) * 100)
+    else:
+        return 0
 
 
 def create_user_profile(sender, instance, created, **kwargs):
@@ -106,6 +134,13 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 post_save.connect(create_user_profile, sender=User)
 
+for model in (Hierarchy, Section):
+    post_save.connect(clear_hierarchy_metadata, sender=model)
+    post_delete.connect(clear_hierarchy_metadata, sender=model)
+
+post_save.connect(visit_recorded, sender=UserPageVisit)
+post_delete.connect(visit_recorded, sender=UserPageVisit)
+
 
 class UserVideoView(models.Model):
     user = models.ForeignKey(User)
@@ -113,14 +148,206 @@ class UserVideoView(models.Model):
     video_duration = models.IntegerField(default=0)
     seconds_viewed = models.IntegerField(default=0)
 
+    # bitset of the seconds watched, see videoanalytics.main.coverage
+    coverage = models.BinaryField(default=b'')
+    unique_seconds = models.IntegerField(default=0)
+
+    # queryset updates must set this themselves, see delta exports
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
     def percent_viewed(self):
         rv = float(self.seconds_viewed) / self.video_duration * 100
         return rv
 
+    def coverage_percent(self):
+        ''' percent of the video watched at least once, unlike
+        percent_viewed re-watching a segment does not count twice'''
+        return float(self.unique_seconds) / self.video_duration * 100
+
+    def watched_intervals(self):
+        return watched_intervals(self.coverage)
+
+    def mark_watched(self, spans):
+        ''' merge (start, end) positions, in seconds, into the coverage '''
+        bitmap = self.coverage
+        for start, end in spans:
+            bitmap, added = mark_seconds(
+                bitmap, max(start, 0), min(end, self.video_duration))
+            self.unique_seconds += added
+        self.coverage = bitmap
+
+    @classmethod
+    def record_view(cls, user_id, video_id, video_duration, seconds_viewed):
+        '''Add seconds_viewed to the user's running total with a single
+        UPDATE. The row is only inserted on the user's first heartbeat for
+        the video. Concurrent heartbeats are summed by the database rather
+        than overwriting each other.'''
+        if cls._increment(user_id, video_id, video_duration, seconds_viewed):
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id, video_id=video_id,
+                    video_duration=video_duration,
+                    seconds_viewed=seconds_viewed)
+        except IntegrityError:
+            # a concurrent heartbeat created the row first
+            cls._increment(user_id, video_id, video_duration, seconds_viewed)
+
+    @classmethod
+    def record_span(cls, user_id, video_id, video_duration, seconds_viewed,
+                    span):
+        '''record_view that also merges the watched (start, end) positions
+        into the coverage. The row is locked, updated and saved in one
+        transaction, so the seconds and the coverage change together.'''
+        with transaction.atomic():
+            view = cls._locked(user_id, video_id, video_duration)
+            view.video_duration = video_duration
+            view.seconds_viewed += seconds_viewed
+            view.mark_watched([span])
+            view.save(update_fields=['video_duration', 'seconds_viewed',
+                                     'coverage', 'unique_seconds',
+                                     'modified'])
+
+    @classmethod
+    def _locked(cls, user_id, video_id, video_duration):
+        views = cls.objects.select_for_update().filter(
+            user_id=user_id, video_id=video_id)
+        view = views.first()
+        if view is not None:
+            return view
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    user_id=user_id, video_id=video_id,
+                    video_duration=video_duration)
+        except IntegrityError:
+            # a concurrent heartbeat created the row first
+            return views.get()
+
+    @classmethod
+    def _increment(cls, user_id, video_id, video_duration, seconds_viewed):
+        return cls.objects.filter(user_id=user_id, video_id=video_id).update(
+            video_duration=video_duration,
+            seconds_viewed=F('seconds_viewed') + seconds_viewed,
+            modified=timezone.now())
+
     class Meta:
         unique_together = (('user', 'video_id'),)
 
 
+class QuizTopicScore(models.Model):
+    '''The get_quiz_summary_by_category results for a user's assessment
+    quizzes in a hierarchy, one row per topic. The user's rows are marked
+    stale when their quiz submissions change, and everyone's when the
+    quiz content changes. Stale rows are recomputed on the next read.
+    A summary without topics is stored as a single EMPTY row.'''
+    quiz_class = 'assessment'
+
+    # the score of the row standing for a summary without topics
+    EMPTY = -1
+
+    user = models.ForeignKey(User)
+    hierarchy = models.ForeignKey(Hierarchy)
+    ordinality = models.PositiveIntegerField(default=0)
+    topic = models.TextField(blank=True, null=True)
+    explanation = models.TextField(blank=True)
+    score = models.IntegerField(default=0)
+    passed = models.IntegerField(default=0)
+    stale = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = (('user', 'hierarchy', 'topic'),)
+        ordering = ('ordinality',)
+
+    def as_dict(self):
+        return {
+            'title': self.topic,
+            'explanation': self.explanation,
+            'score': self.score,
+            'passed': self.passed
+        }
+
+    @staticmethod
+    def quiz_blocks(hierarchy):
+        return get_quizzes_by_css_class(hierarchy, QuizTopicScore.quiz_class)
+
+    @staticmethod
+    def summarize(user, hierarchy, blocks=None):
+        if blocks is None:
+            blocks = QuizTopicScore.quiz_blocks(hierarchy)
+        return get_quiz_summary_by_category(blocks, user)
+
+    @staticmethod
+    def from_rows(rows):
+        '''topics from stored rows, or None if they need recomputing'''
+        if len(rows) == 0 or any(row.stale for row in rows):
+            return None
+        topics = {}
+        for row in rows:
+            if row.score != QuizTopicScore.EMPTY:
+                topics[row.topic] = row.as_dict()
+        return topics
+
+    @classmethod
+    def refresh(cls, user, hierarchy, blocks=None):
+        return cls.store(user, hierarchy,
+                         cls.summarize(user, hierarchy, blocks))
+
+    @classmethod
+    def store(cls, user, hierarchy, topics):
+        rows = [cls(user=user, hierarchy=hierarchy, ordinality=i,
+                    topic=t['title'], explanation=t['explanation'],
+                    score=t['score'], passed=t['passed'])
+                for i, t in enumerate(topics.values())]
+        if len(rows) == 0:
+            rows = [cls(user=user, hierarchy=hierarchy, score=cls.EMPTY)]
+
+        try:
+            with transaction.atomic():
+                cls.objects.filter(user=user, hierarchy=hierarchy).delete()
+                cls.objects.bulk_create(rows)
+        except IntegrityError:
+            # a concurrent request stored the user's scores first
+            pass
+        return topics
+
+    @classmethod
+    def topics(cls, user, hierarchy):
+        rows = list(cls.objects.filter(user=user, hierarchy=hierarchy))
+        topics = cls.from_rows(rows)
+        if topics is None:
+            topics = cls.refresh(user, hierarchy)
+        return topics
+
+
+def quiz_topic_scores_stale(sender, instance, **kwargs):
+    if sender == Response:
+        # the submission may be deleted along with its responses
+        users = Submission.objects.filter(
+            id=instance.submission_id).values('user')
+    else:
+        users = [instance.user_id]
+    QuizTopicScore.objects.filter(user__in=users).update(stale=True)
+
+
+def all_quiz_topic_scores_stale(*args, **kwargs):
+    '''quiz content edits, e.g. a correct answer, a question's topic or
+    order, or an assessment block, can change every user's scores'''
+    QuizTopicScore.objects.update(stale=True)
+
+
+for model in (Submission, Response):
+    post_save.connect(quiz_topic_scores_stale, sender=model)
+    post_delete.connect(quiz_topic_scores_stale, sender=model)
+
+for model in (PageBlock, Quiz, Question, Answer):
+    post_save.connect(all_quiz_topic_scores_stale, sender=model)
+    post_delete.connect(all_quiz_topic_scores_stale, sender=model)
+
+
 class QuizSummaryReportColumn(ReportColumnInterface):
     def __init__(self, topic):
         self.topic = topic
@@ -140,15 +367,48 @@ class QuizSummaryReportColumn(ReportColumnInterface):
         if not Submission.objects.filter(user=user).exists():
             return ''
 
-        blocks = get_quizzes_by_css_class(
-            user.profile.default_hierarchy(), 'assessment')
-        values = get_quiz_summary_by_category(blocks, user)
+        values = QuizTopicScore.topics(
+            user, user.profile.default_hierarchy())
 
         if self.identifier() in values:
             return values[self.identifier()]['score']
         else:
             return ''
 
+    def bulk_user_value(self, user, chunk):
+        hierarchy = chunk.hierarchy(user.profile.research_group)
+        if hierarchy.name == CONTROL_GROUP:
+            return '-'
+
+        if user.id not in chunk.lookup('submitters', load_submitters):
+            return ''
+
+        # computed once for all the sibling topic columns
+        values = chunk.memo.get(
+            (user.id, hierarchy.id, QuizTopicScore.quiz_class),
+            lambda: self.bulk_topics(user, hierarchy, chunk))
+
+        if self.identifier() in values:
+            return values[self.identifier()]['score']
+        else:
+            return ''
+
+    def bulk_topics(self, user, hierarchy, chunk):
+        scores = chunk.lookup('topic_scores', load_topic_scores)
+        if (user.id, hierarchy.id) in scores:
+            return scores[(user.id, hierarchy.id)]
+
+        blocks = chunk.memo.get(
+            ('quiz_blocks', hierarchy.id, QuizTopicScore.quiz_class),
+            lambda: list(QuizTopicScore.quiz_blocks(hierarchy)))
+
+        # the chunk's users are scored together, then stored one by one
+        quiz_scores = chunk.lookup(
+            ('quiz_scores', hierarchy.id, QuizTopicScore.quiz_class),
+            lambda user_ids: QuizScores(blocks, user_ids))
+        return QuizTopicScore.store(user, hierarchy,
+                                    quiz_scores.summary(user.id))
+
 
 @python_2_unicode_compatible
 class QuizSummaryBlock(models.Model):
@@ -243,6 +503,19 @@ class YouTubeReportColumn(ReportColumnInterface):
         except UserVideoView.DoesNotExist:
             return 0
 
+    def bulk_user_value(self, user, chunk):
+        percent = self.bulk_typed_value(user, chunk)
+        if percent is None:
+            return 0
+        return '{}'.format(percent)
+
+    def bulk_typed_value(self, user, chunk):
+        views = chunk.lookup('video_views', load_video_views)
+        view = views.get((user.id, self.identifier()))
+        if view is None:
+            return None
+        return view.percent_viewed()
+
 
 class YouTubeBlock(models.Model):
     pageblocks = GenericRelation(
@@ -316,11 +589,380 @@ class YouTubeForm(forms.ModelForm):
 ReportableInterface.register(YouTubeBlock)
 
 
+def prefetch_blocks(pageblocks):
+    '''load the blocks of pageblocks, each block type in one query along
+    with the blocks' pageblocks and the related objects in
+    BLOCK_PREFETCH'''
+    prefetch_related_objects(pageblocks, 'content_object')
+
+    blocks = {}
+    for p in pageblocks:
+        if p.content_object is not None:
+            blocks.setdefault(type(p.content_object), []).append(
+                p.content_object)
+
+    for model, model_blocks in blocks.items():
+        # templates link to block.pageblock
+        prefetch_related_objects(model_blocks, 'pageblocks',
+                                 *BLOCK_PREFETCH.get(model, []))
+
+
+def load_video_views(user_ids):
+    # the report never reads the coverage bitsets
+    views = UserVideoView.objects.filter(
+        user__id__in=user_ids).defer('coverage')
+    return dict(((v.user_id, v.video_id), v) for v in views)
+
+
+def load_submitters(user_ids):
+    return set(Submission.objects.filter(
+        user__id__in=user_ids).values_list('user__id', flat=True))
+
+
+def load_topic_scores(user_ids):
+    '''map (user id, hierarchy id) to the user's stored quiz topics,
+    omitting any that need recomputing'''
+    rows = {}
+    qs = QuizTopicScore.objects.filter(user__id__in=user_ids).order_by(
+        'user', 'hierarchy', 'ordinality')
+    for row in qs:
+        rows.setdefault((row.user_id, row.hierarchy_id), []).append(row)
+
+    scores = {}
+    for key, topic_rows in rows.items():
+        topics = QuizTopicScore.from_rows(topic_rows)
+        if topics is not None:
+            scores[key] = topics
+    return scores
+
+
+def load_page_visits(user_ids):
+    '''map user id to ({hierarchy id: pages visited}, first visit, last
+    visit) from a single grouped query'''
+    qs = UserPageVisit.objects.filter(user__id__in=user_ids).values(
+        'user__id', 'section__hierarchy__id').annotate(
+        visits=Count('id'), first_access=Min('first_visit'),
+        last_access=Max('last_visit')).order_by()
+
+    summaries = {}
+    for row in qs:
+        visits, first, last = summaries.get(row['user__id'], ({}, [], []))
+        visits[row['section__hierarchy__id']] = row['visits']
+        if row['first_access'] is not None:
+            first.append(row['first_access'])
+        if row['last_access'] is not None:
+            last.append(row['last_access'])
+        summaries[row['user__id']] = (visits, first, last)
+
+    return dict(
+        (user_id, (visits, min(first or [None]), max(last or [None])))
+        for user_id, (visits, first, last) in summaries.items())
+
+
+def page_visit_summary(user, chunk):
+    summaries = chunk.lookup('page_visits', load_page_visits)
+    return summaries.get(user.id, ({}, None, None))
+
+
+def bulk_percent_complete(user, chunk):
+    metadata = chunk.hierarchy_metadata(user.profile.research_group)
+    visits = page_visit_summary(user, chunk)[0]
+    return percent_of_pages(visits.get(metadata.hierarchy.id, 0),
+                            metadata.page_count)
+
+
+def active_user_ids(since):
+    '''ids of users who visited a page, watched a video, submitted a quiz
+    or had their profile created or changed after since'''
+    ids = set(UserPageVisit.objects.filter(
+        last_visit__gt=since).values_list('user__id', flat=True))
+    ids.update(UserVideoView.objects.filter(
+        modified__gt=since).values_list('user__id', flat=True))
+    ids.update(Submission.objects.filter(
+        submitted__gt=since).values_list('user__id', flat=True))
+    ids.update(UserProfile.objects.filter(
+        modified__gt=since).values_list('user__id', flat=True))
+    return ids
+
+
+def question_column_bulk_value(column, user, chunk):
+    '''QuestionColumn.user_value evaluated against the chunk's
+    prefetched submissions'''
+    latest = chunk.lookup('latest_responses', latest_responses)
+    question = column.question
+    submission = latest.get((user.id, question.quiz_id))
+    if submission is None:
+        return None
+
+    value = ''
+    values = submission.get(question.id, [])
+    if len(values) > 0:
+        if question.is_single_choice():
+            value = column._answer_cache[values[0]]
+        elif question.is_multiple_choice():
+            if column.answer.value in values:
+                value = column.answer.id
+        else:  # short or long text
+            value = values[0]
+
+    return smart_text(value)
+
+
+class ProfileReportColumn(StandaloneReportColumn):
+    '''A StandaloneReportColumn whose bulk_func(user, chunk) computes the
+    same value as value_func from the chunk's lookup tables. If given,
+    format_func turns the bulk value into value_func's display value.'''
+
+    def __init__(self, name, group, value_type, description, value_func,
+                 bulk_func, format_func=None):
+        super(ProfileReportColumn, self).__init__(
+            name, group, value_type, description, value_func)
+        self.bulk_func = bulk_func
+        self.format_func = format_func
+
+    def bulk_user_value(self, user, chunk):
+        value = self.bulk_func(user, chunk)
+        if self.format_func is not None:
+            value = self.format_func(value)
+        return value
+
+    def bulk_typed_value(self, user, chunk):
+        return self.bulk_func(user, chunk)
+
+
+class ReportMemo(object):
+    '''Values computed once per VideoAnalyticsReport.values() run and
+    shared by every column that asks for the same key, e.g. the quiz
+    summary read by all of a QuizSummaryBlock's topic columns. hits and
+    misses count the lookups. Keys for a user's values start with the
+    user id.'''
+
+    def __init__(self):
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self._values:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._values[key] = compute()
+        return self._values[key]
+
+    def release(self, user_ids):
+        '''drop the values of users whose rows have been written'''
+        user_ids = set(user_ids)
+        for key in list(self._values.keys()):
+            if key[0] in user_ids:
+                del self._values[key]
+
+
+class ReportChunk(object):
+    '''A batch of users evaluated together by VideoAnalyticsReport.values().
+    Columns implementing bulk_user_value(user, chunk) share the lookup
+    tables loaded here, one set of queries per chunk rather than per cell.
+    '''
+
+    def __init__(self, users, memo=None):
+        self.users = users
+        self.user_ids = [u.id for u in users]
+        self.memo = memo if memo is not None else ReportMemo()
+        self._lookups = {}
+        self._hierarchies = {}
+
+    def lookup(self, name, loader):
+        if name not in self._lookups:
+            self._lookups[name] = loader(self.user_ids)
+        return self._lookups[name]
+
+    def hierarchy(self, name):
+        if name not in self._hierarchies:
+            self._hierarchies[name] = Hierarchy.get_hierarchy(name)
+        return self._hierarchies[name]
+
+    def hierarchy_metadata(self, name):
+        '''hierarchy_metadata, checked against the content version once
+        per chunk rather than per user'''
+        key = ('metadata', name)
+        if key not in self._hierarchies:
+            self._hierarchies[key] = hierarchy_metadata(name)
+        return self._hierarchies[key]
+
+    def user_value(self, column, user):
+        if hasattr(column, 'bulk_user_value'):
+            return column.bulk_user_value(user, self)
+        if isinstance(column, QuestionColumn):
+            return question_column_bulk_value(column, user, self)
+        return column.user_value(user)
+
+    def typed_value(self, column, user):
+        '''the value before formatting for the csv, None when missing.
+        Columns without bulk_typed_value answer user_value.'''
+        if hasattr(column, 'bulk_typed_value'):
+            return column.bulk_typed_value(user, self)
+        return self.user_value(column, user)
+
+
+# the report columns are cached until the content changes. quizblock's
+# reorder views save nothing, see ReorderQuestionsView
+for model in (PageBlock, YouTubeBlock, QuizSummaryBlock, Quiz, Question,
+              Answer):
+    post_save.connect(clear_hierarchy_metadata, sender=model)
+    post_delete.connect(clear_hierarchy_metadata, sender=model)
+
+
 class VideoAnalyticsReport(PagetreeReport):
+    '''Columns discovered from the pageblocks and the key rows are cached
+    per content version, see videoanalytics.main.structure.
+
+    identifiers limits the report to those value columns, as named in the
+    values header, and the key to the rows describing them.'''
+
+    def __init__(self, identifiers=None):
+        super(VideoAnalyticsReport, self).__init__()
+        self.identifiers = identifiers
 
     def users(self):
         users = User.objects.exclude(is_superuser=True).exclude(is_staff=True)
-        return users.order_by('id')
+        return users.select_related('profile').order_by('id')
+
+    def user_chunks(self, chunk_size=REPORT_CHUNK_SIZE, memo=None,
+                    users=None):
+        if memo is None:
+            memo = ReportMemo()
+        if users is None:
+            users = self.users()
+
+        # iterator() streams the users through a server-side cursor on
+        # PostgreSQL, only one chunk of them is held in memory at a time
+        chunk = []
+        for user in users.iterator():
+            chunk.append(user)
+            if len(chunk) == chunk_size:
+                yield ReportChunk(chunk, memo)
+                chunk = []
+        if len(chunk) > 0:
+            yield ReportChunk(chunk, memo)
+
+    def report_blocks(self, hierarchies):
+        '''the reportable blocks on the hierarchies' pages in page order.
+        Each block type is loaded in one batch, with the pageblock,
+        section and hierarchy its report columns read.'''
+        hierarchy_ids = [h.id for h in hierarchies]
+        pageblocks = PageBlock.objects.filter(
+            section__hierarchy__in=hierarchy_ids,
+            section__depth__gt=1,  # the root is not a page
+            content_type__in=self.types)
+        pageblocks = pageblocks.order_by('section__path', 'ordinality')
+        pageblocks = sorted(
+            pageblocks.values_list(
+                'section__hierarchy', 'content_type', 'object_id'),
+            key=lambda p: hierarchy_ids.index(p[0]))
+
+        object_ids = {}
+        for hierarchy_id, content_type_id, object_id in pageblocks:
+            object_ids.setdefault(content_type_id, []).append(object_id)
+
+        blocks = {}
+        for content_type in self.types:
+            model = content_type.model_class()
+            related = [Prefetch('pageblocks', PageBlock.objects.select_related(
+                'section__hierarchy'))] + BLOCK_PREFETCH.get(model, [])
+            qs = model.objects.filter(
+                pk__in=object_ids.get(content_type.id, []))
+            for block in qs.prefetch_related(*related):
+                blocks[(content_type.id, block.pk)] = block
+
+        # pageblocks whose block was deleted are skipped
+        return [blocks[(p[1], p[2])] for p in pageblocks
+                if (p[1], p[2]) in blocks]
+
+    def block_columns(self, hierarchies, kind):
+        '''the report_metadata or report_values columns of the
+        hierarchies' blocks'''
+        def build():
+            columns = []
+            for block in self.report_blocks(hierarchies):
+                columns += getattr(block, kind)()
+            return columns
+
+        return versioned((kind, tuple(h.id for h in hierarchies)), build)
+
+    def metadata_columns(self, hierarchies):
+        columns = self.standalone_columns() + self.block_columns(
+            hierarchies, 'report_metadata')
+        if self.identifiers is None:
+            return columns
+
+        # a choice question's key rows are per answer, but share the
+        # question's itemIdentifier
+        return [column for column in columns
+                if column.identifier() in self.identifiers or
+                column.metadata()[1] in self.identifiers]
+
+    def value_columns(self, hierarchies):
+        columns = self.standalone_columns() + self.block_columns(
+            hierarchies, 'report_values')
+        if self.identifiers is None:
+            return columns
+        return self.select_columns(columns, self.identifiers)
+
+    def metadata(self, hierarchies):
+        hierarchy_ids = tuple(h.id for h in hierarchies)
+        identifiers = None
+        if self.identifiers is not None:
+            identifiers = tuple(sorted(set(self.identifiers)))
+        rows = versioned(
+            ('key', hierarchy_ids, identifiers),
+            lambda: list(super(VideoAnalyticsReport, self).metadata(
+                hierarchies)))
+        for row in rows:
+            yield row
+
+    def values(self, hierarchies):
+        '''Same rows as PagetreeReport.values, but users are evaluated a
+        chunk at a time so bulk-capable columns can prefetch their data.
+        self.memo holds the values shared across the run's columns.'''
+        columns = self.value_columns(hierarchies)
+
+        yield self.value_headers(columns)
+
+        for row in self.user_rows(columns):
+            yield row
+
+    def delta_values(self, hierarchies, since):
+        '''values() for just the users active after since. Merged into a
+        snapshot taken at since with export.merge_delta, the result is
+        the full report.'''
+        columns = self.value_columns(hierarchies)
+
+        yield self.value_headers(columns)
+
+        users = self.users().filter(id__in=active_user_ids(since))
+        for row in self.user_rows(columns, users):
+            yield row
+
+    def user_rows(self, columns, users=None, typed=False):
+        '''the value rows of users, a subset of self.users(), or of all
+        the report's users. typed rows hold the values before formatting
+        for the csv, see ReportChunk.typed_value.'''
+        self.memo = ReportMemo()
+        for chunk in self.user_chunks(memo=self.memo, users=users):
+            value = chunk.typed_value if typed else chunk.user_value
+            for user in chunk.users:
+                yield [value(column, user) for column in columns]
+            self.memo.release(chunk.user_ids)
+
+    def select_columns(self, columns, identifiers):
+        '''the columns with the given identifiers in report order. Only
+        the selected columns' values are computed by user_rows.'''
+        available = set(column.identifier() for column in columns)
+        unknown = sorted(set(identifiers) - available)
+        if len(unknown) > 0:
+            raise ValueError('Unknown column: %s' % ', '.join(unknown))
+        return [column for column in columns
+                if column.identifier() in identifiers]
 
     def standalone_columns(self):
         return [
@@ -330,13 +972,91 @@ class VideoAnalyticsReport(PagetreeReport):
             StandaloneReportColumn(
                 'research_group', 'profile', 'string',
                 'Research Group', lambda x: x.profile.research_group),
-            StandaloneReportColumn(
+            ProfileReportColumn(
                 'percent_complete', 'profile', 'percent',
                 '% of hierarchy completed',
-                lambda x: x.profile.percent_complete()),
-            StandaloneReportColumn(
+                lambda x: x.profile.percent_complete(),
+                bulk_percent_complete),
+            ProfileReportColumn(
                 'first_access', 'profile', 'date string', 'first access date',
-                lambda x: x.profile.first_access_formatted()),
-            StandaloneReportColumn(
+                lambda x: x.profile.first_access_formatted(),
+                lambda x, chunk: page_visit_summary(x, chunk)[1],
+                access_formatted),
+            ProfileReportColumn(
                 'last_access', 'profile', 'date string', 'last access date',
-                lambda x: x.profile.last_access_formatted())]
+                lambda x: x.profile.last_access_formatted(),
+                lambda x, chunk: page_visit_summary(x, chunk)[2],
+                access_formatted)]
+
+
+class ReportStorage(FileSystemStorage):
+    '''ReportJob artifacts, in the local REPORT_JOB_ROOT directory. The
+    reports hold participant data, so they are kept out of the default
+    storage, which production serves publicly from S3, and have no url.
+    The worker and the web processes must share the directory.'''
+
+    @property
+    def base_location(self):
+        return settings.REPORT_JOB_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+report_storage = ReportStorage()
+
+
+class ReportJob(models.Model):
+    '''A VideoAnalyticsReport export built by the run_report_jobs worker
+    into a csv file under REPORT_JOB_ROOT'''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    REPORT_TYPES = (('key', 'Report Keys'), ('values', 'Report Values'))
+
+    report_type = models.CharField(max_length=10, choices=REPORT_TYPES)
+    status = models.CharField(max_length=10, default=QUEUED, db_index=True)
+    requested_by = models.ForeignKey(User, null=True, blank=True,
+                                     on_delete=models.SET_NULL)
+    created = models.DateTimeField(auto_now_add=True, editable=False)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    rows_total = models.IntegerField(default=0)
+    rows_written = models.IntegerField(default=0)
+    artifact = models.FileField(upload_to='reports', blank=True,
+                                storage=report_storage)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+
+    def is_finished(self):
+        return self.status in (self.COMPLETE, self.FAILED)
+
+    def percent_complete(self):
+        if self.status == self.COMPLETE:
+            return 100
+        if self.rows_total > 0:
+            return int(self.rows_written / float(self.rows_total) * 100)
+        return 0
+
+    def filename(self):
+        return 'videoanalytics_%s.csv' % self.report_type
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'report_type': self.report_type,
+            'status': self.status,
+            'rows_written': self.rows_written,
+            'rows_total': self.rows_total,
+            'percent_complete': self.percent_complete(),
+            'error': self.error
+        }
@@ -0,0 +1,167 @@
+'''Query budgets for the participant pages rendered by RestrictedPageView
+and VideoPageView, and the course they are measured against.
+
+build_course() creates the hierarchies a, b and videos shaped like the
+study. Each of a and b has a welcome page, an assessment pre-test, the
+quiz summary (b only), a run of topic pages and a post-test. videos is
+a run of video pages. measure_pages() renders one page of each type as
+a participant who has visited every page and taken the pre-test.
+
+PAGE_QUERY_BUDGETS is the most queries each page type may take on the
+default course. The benchmark_pages command and the test suite fail when
+a page goes over.'''
+
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from pageblocks.models import HTMLBlock
+from pagetree.helpers import get_hierarchy
+from pagetree.models import PageBlock, UserPageVisit
+from quizblock.models import Answer, Question, Quiz, Response, Submission
+
+from videoanalytics.main.models import QuizSummaryBlock, QuizTopicScore, \
+    YouTubeBlock
+
+
+TOPICS = ['thermodynamics', 'reaction_classes', 'redox_chemistry',
+          'mechanisms', 'paper_figures']
+
+# the default course
+TOPIC_PAGES = 20
+VIDEO_PAGES = 20
+QUESTIONS = 10
+ANSWERS = 4
+
+PAGE_QUERY_BUDGETS = {
+    'a/text': 43,
+    'a/quiz': 79,
+    'b/text': 42,
+    'b/quiz': 79,
+    'b/summary': 46,
+    'videos/video': 36,
+}
+
+
+def add_page(root, slug, blocks):
+    '''blocks is a list of (label, css_extra, block)'''
+    section = root.append_child(slug.replace('-', ' ').title(), slug)
+    for label, css_extra, block in blocks:
+        section.append_pageblock(label, css_extra, content_object=block)
+    return section
+
+
+def text_block():
+    return ('', '', HTMLBlock.objects.create(html='<p>Some text.</p>'))
+
+
+def make_quiz(questions):
+    quiz = Quiz.objects.create()
+    for i in range(questions):
+        topic = TOPICS[i % len(TOPICS)]
+        question = Question.objects.create(
+            quiz=quiz, text='Question %d' % i, css_extra=topic,
+            question_type='single choice', explanation='<p>%s</p>' % topic)
+        for j in range(ANSWERS):
+            Answer.objects.create(question=question, value=str(j),
+                                  label='Answer %d' % j, correct=(j == 0))
+    return quiz
+
+
+def build_hierarchy(name, topic_pages, questions, summary):
+    root = get_hierarchy(name, '/pages/%s/' % name).get_root()
+    add_page(root, 'welcome', [text_block()])
+    add_page(root, 'pre-test', [('Pre-Test', QuizTopicScore.quiz_class,
+                                 make_quiz(questions))])
+    if summary:
+        add_page(root, 'recommendations',
+                 [('', '', QuizSummaryBlock.objects.create())])
+    for i in range(topic_pages):
+        add_page(root, 'topic-%d' % i, [text_block(), text_block()])
+    add_page(root, 'post-test', [('Post-Test', 'post-test',
+                                  make_quiz(questions))])
+
+
+def build_videos(video_pages):
+    root = get_hierarchy('videos', '/pages/videos/').get_root()
+    for i in range(video_pages):
+        video = YouTubeBlock.objects.create(video_id='video%d' % i,
+                                            title='Video %d' % i)
+        add_page(root, 'video-%d' % i, [('', '', video), text_block()])
+
+
+def build_course(topic_pages=TOPIC_PAGES, video_pages=VIDEO_PAGES,
+                 questions=QUESTIONS):
+    build_hierarchy('a', topic_pages, questions, summary=False)
+    build_hierarchy('b', topic_pages, questions, summary=True)
+    build_videos(video_pages)
+
+
+def make_participant(research_group):
+    '''a participant who has visited every page and taken the pre-test'''
+    user = User.objects.create_user('budget-%s' % research_group)
+    user.profile.research_group = research_group
+    user.profile.save()
+
+    for name in (research_group, 'videos'):
+        root = get_hierarchy(name).get_root()
+        for section in root.get_descendants():
+            UserPageVisit.objects.create(user=user, section=section,
+                                         status='complete')
+
+    quiz = PageBlock.objects.get(section__hierarchy__name=research_group,
+                                 section__slug='pre-test').block()
+    submission = Submission.objects.create(quiz=quiz, user=user)
+    for i, question in enumerate(quiz.question_set.all()):
+        Response.objects.create(question=question, submission=submission,
+                                value=str(i % 2))
+    return user
+
+
+def course_pages(topic_pages=TOPIC_PAGES, video_pages=VIDEO_PAGES):
+    '''(page type, research group, url) of the pages measured'''
+    topic = 'topic-%d' % (topic_pages - 1)
+    video = 'video-%d' % (video_pages - 1)
+    return [
+        ('a/text', 'a', '/pages/a/%s/' % topic),
+        ('a/quiz', 'a', '/pages/a/pre-test/'),
+        ('b/text', 'b', '/pages/b/%s/' % topic),
+        ('b/quiz', 'b', '/pages/b/pre-test/'),
+        ('b/summary', 'b', '/pages/b/recommendations/'),
+        ('videos/video', 'b', '/pages/videos/%s/' % video),
+    ]
+
+
+def measure_page(client, url, repeat=1):
+    '''(queries, seconds) of a GET of url. The queries are those of the
+    first request, as a participant mostly sees a page once. With repeat,
+    the time is the median of the requests.'''
+    queries = None
+    times = []
+    for i in range(repeat):
+        reset_queries()  # the query log is capped, building fills it
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.time()
+            response = client.get(url)
+            times.append(time.time() - start)
+        if response.status_code != 200:
+            raise ValueError('%s returned %d' % (url, response.status_code))
+        if queries is None:
+            queries = len(ctx.captured_queries)
+    return queries, sorted(times)[len(times) // 2]
+
+
+def measure_pages(pages, repeat=1):
+    '''(page type, queries, seconds) of each of pages, see course_pages'''
+    clients = {}
+    results = []
+    for page_type, research_group, url in pages:
+        if research_group not in clients:
+            clients[research_group] = Client()
+            clients[research_group].force_login(
+                make_participant(research_group))
+        queries, seconds = measure_page(clients[research_group], url, repeat)
+        results.append((page_type, queries, seconds))
+    return results
@@ -0,0 +1,96 @@
+'''Audience retention curves computed from the UserVideoView coverage
+bitsets. All viewers of a video are unpacked into one viewers x seconds
+matrix so the curve and quantiles are single NumPy reductions.'''
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from videoanalytics.main.models import UserVideoView
+
+
+ALL_GROUPS = 'all'
+QUANTILES = [25, 50, 75, 90]
+
+
+class RetentionCurve(object):
+    def __init__(self, video_id, research_group, duration, watching,
+                 fractions):
+        self.video_id = video_id
+        self.research_group = research_group
+        self.duration = duration
+        self.viewers = len(fractions)
+
+        # share of viewers who watched each second of the video
+        self.curve = watching
+        self.quantiles = dict(zip(
+            QUANTILES, np.percentile(fractions, QUANTILES).tolist()))
+
+    def median(self):
+        return self.quantiles[50]
+
+    def quantile_values(self):
+        return [self.quantiles[q] for q in QUANTILES]
+
+
+def coverage_matrix(bitmaps, duration):
+    '''viewers x seconds matrix of 0/1 watched flags'''
+    width = (duration + 7) // 8
+    padded = b''.join(
+        bytes(bytearray(bitmap)[:width]).ljust(width, b'\0')
+        for bitmap in bitmaps)
+    packed = np.frombuffer(padded, dtype=np.uint8).reshape(
+        len(bitmaps), width)
+    return np.unpackbits(packed, axis=1)[:, :duration]
+
+
+def compute_curves(video_id, views):
+    '''views is a list of (research group, video duration, coverage,
+    unique seconds) tuples'''
+    duration = max(v[1] for v in views)
+    groups = np.array([v[0] for v in views])
+    matrix = coverage_matrix([v[2] for v in views], duration)
+    fractions = np.minimum(
+        np.array([v[3] for v in views], dtype=float) / duration, 1.0)
+
+    curves = [RetentionCurve(video_id, ALL_GROUPS, duration,
+                             matrix.mean(axis=0).tolist(), fractions)]
+    for group in sorted(set(groups.tolist())):
+        selected = groups == group
+        curves.append(RetentionCurve(
+            video_id, group, duration,
+            matrix[selected].mean(axis=0).tolist(), fractions[selected]))
+    return curves
+
+
+def video_viewers(video_id):
+    '''views of the video by participants who watched some of it. Staff
+    are not participants, as in VideoAnalyticsReport.users.'''
+    return UserVideoView.objects.filter(
+        video_id=video_id, video_duration__gt=0, unique_seconds__gt=0).exclude(
+        user__is_superuser=True).exclude(user__is_staff=True)
+
+
+def coverage_stamp(video_id):
+    '''Changes whenever a heartbeat adds a watched second or a viewer,
+    the only writes that can change the curves'''
+    stamp = video_viewers(video_id).aggregate(
+        viewers=Count('id'), seconds=Sum('unique_seconds'),
+        duration=Sum('video_duration'))
+    return '%s.%s.%s' % (stamp['viewers'], stamp['seconds'],
+                         stamp['duration'])
+
+
+def video_retention(video_id):
+    '''Retention curves for all viewers of the video, then one per
+    research group. Cached until the video's coverage changes.'''
+    key = 'videoanalytics.retention.%s.%s' % (
+        video_id, coverage_stamp(video_id))
+    curves = cache.get(key)
+    if curves is None:
+        views = list(video_viewers(video_id).values_list(
+            'user__profile__research_group', 'video_duration', 'coverage',
+            'unique_seconds'))
+        curves = compute_curves(video_id, views) if len(views) > 0 else []
+        cache.set(key, curves)
+    return curves
@@ -0,0 +1,73 @@
+'''Process-level cache of values derived from the course content alone:
+the hierarchy structure the UserProfile methods and gate checks read on
+every page view and report row (the root section, its first child, the
+last leaf and the pages in order), the hierarchy list, and the
+VideoAnalyticsReport columns and key rows.
+
+Entries are stamped with a content version token kept in the database,
+in main.ContentVersion, so every process sees it change. Any pagetree
+edit replaces the token through PAGETREE_CUSTOM_CACHE_CLEAR or the signal
+handlers in main.models, and each process then rebuilds its entries on
+the next read. Checking the token costs one query per read.'''
+
+import uuid
+
+from django.apps import apps
+
+
+_entries = {}
+
+
+class HierarchyMetadata(object):
+    def __init__(self, hierarchy):
+        self.hierarchy = hierarchy
+        self.root = hierarchy.get_root()
+        self.first_child = self.root.get_first_child()
+        self.last_leaf = hierarchy.get_last_leaf(self.root)
+
+        # every section below the root is a page, in depth-first order
+        self.sections = list(self.root.get_descendants())
+        self.positions = dict(
+            (section.id, i) for i, section in enumerate(self.sections))
+        self.page_count = len(self.sections)
+
+
+def structure_version():
+    versions = apps.get_model('main', 'ContentVersion').objects
+    version = versions.filter(pk=1).values_list('token', flat=True).first()
+    if version is None:
+        version = versions.get_or_create(
+            pk=1, defaults={'token': uuid.uuid4().hex})[0].token
+    return version
+
+
+def versioned(key, build):
+    '''the value built by build(), kept until the content changes'''
+    version = structure_version()
+    entry = _entries.get(key)
+    if entry is None or entry[0] != version:
+        entry = (version, build())
+        _entries[key] = entry
+    return entry[1]
+
+
+def hierarchy_metadata(name):
+    hierarchy = apps.get_model('pagetree', 'Hierarchy')
+    return versioned(
+        ('metadata', name),
+        lambda: HierarchyMetadata(hierarchy.get_hierarchy(name)))
+
+
+def all_hierarchies():
+    '''all hierarchies in id order'''
+    hierarchy = apps.get_model('pagetree', 'Hierarchy')
+    return versioned(('hierarchies',),
+                     lambda: list(hierarchy.objects.order_by('id')))
+
+
+def clear_hierarchy_metadata(*args, **kwargs):
+    '''PAGETREE_CUSTOM_CACHE_CLEAR hook & signal handler for content
+    edits'''
+    _entries.clear()
+    apps.get_model('main', 'ContentVersion').objects.update_or_create(
+        pk=1, defaults={'token': uuid.uuid4().hex})
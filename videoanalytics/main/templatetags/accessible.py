@@ -1,5 +1,7 @@
 from django import template
 
+from videoanalytics.main.unlocks import gate_check
+
 register = template.Library()
 
 
@@ -15,7 +17,7 @@ class AccessibleNode(template.Node):
             r = context['request']
             u = r.user
 
-            visited, last_section = m.gate_check(u)
+            visited, last_section = gate_check(u, m)
             if visited:
                 return self.nodelist_true.render(context)
 
@@ -1,7 +1,7 @@
 from django import template
 from django.contrib.contenttypes.models import ContentType
 from pagetree.models import PageBlock
-from quizblock.models import Quiz
+from quizblock.models import Answer, Question, Quiz, Submission
 
 
 register = template.Library()
@@ -19,10 +19,67 @@ def get_quizzes_by_css_class(hierarchy, cls):
         section__hierarchy=hierarchy)
 
 
-def get_quiz_summary_by_category(blocks, user):
-    topics = {}
-    for b in blocks:
-        for question in b.content_object.question_set.all():
+def latest_responses(user_ids, quiz_ids=None):
+    """map (user id, quiz id) to the {question id: [values]} of the user's
+    most recent submission for that quiz, as Question.user_responses reads
+    them. A submission with no responses maps to an empty dict. quiz_ids
+    limits the quizzes."""
+    submissions = Submission.objects.filter(user__in=user_ids)
+    if quiz_ids is not None:
+        submissions = submissions.filter(quiz__in=quiz_ids)
+
+    latest = {}
+    for user_id, quiz_id, submission_id, question_id, value in \
+            submissions.order_by(
+                'user', 'quiz', '-submitted', '-id',
+                'response__id').values_list(
+                'user_id', 'quiz_id', 'id', 'response__question_id',
+                'response__value'):
+        submission = latest.setdefault((user_id, quiz_id),
+                                       (submission_id, {}))
+        if submission[0] == submission_id and question_id is not None:
+            submission[1].setdefault(question_id, []).append(value)
+    return dict((key, s[1]) for key, s in latest.items())
+
+
+class QuizScores(object):
+    """get_quiz_summary_by_category for several users. The blocks'
+    questions, their correct answers and the users' latest responses are
+    loaded in three queries, then each user is scored in memory with the
+    rules of Question.is_user_correct."""
+
+    def __init__(self, blocks, user_ids):
+        quiz_ids = [b.object_id for b in blocks]
+        questions = {}
+        for question in Question.objects.filter(quiz__in=quiz_ids):
+            questions.setdefault(question.quiz_id, []).append(question)
+        self.questions = [question for quiz_id in quiz_ids
+                          for question in questions.get(quiz_id, [])]
+
+        self.correct = {}
+        for question_id, value in Answer.objects.filter(
+                question__in=self.questions, correct=True).values_list(
+                'question_id', 'value'):
+            self.correct.setdefault(question_id, []).append(value)
+
+        self.responses = latest_responses(user_ids, quiz_ids)
+
+    def is_user_correct(self, question, user_id):
+        responses = self.responses.get(
+            (user_id, question.quiz_id), {}).get(question.id)
+        if not responses:
+            return None  # incomplete
+
+        answers = self.correct.get(question.id, [])
+        if not question.answerable() or len(answers) == 0:
+            return True
+
+        return (len(answers) == len(responses) and
+                set(responses).issubset(answers))
+
+    def summary(self, user_id):
+        topics = {}
+        for question in self.questions:
             if question.css_extra not in topics:
                 topics[question.css_extra] = {
                     'title': question.css_extra,
@@ -31,12 +88,16 @@ def get_quiz_summary_by_category(blocks, user):
                     'passed': 0
                 }
 
-            if question.is_user_correct(user):
-                topics[question.css_extra]['score'] += 1
-                topics[question.css_extra]['passed'] = \
-                    1 if topics[question.css_extra]['score'] > 1 else 0
+            if self.is_user_correct(question, user_id):
+                topic = topics[question.css_extra]
+                topic['score'] += 1
+                topic['passed'] = 1 if topic['score'] > 1 else 0
+
+        return topics
+
 
-    return topics
+def get_quiz_summary_by_category(blocks, user):
+    return QuizScores(blocks, [user.id]).summary(user.id)
 
 
 class GetQuizSummary(template.Node):
@@ -46,11 +107,18 @@ class GetQuizSummary(template.Node):
         self.var_name = var_name
 
     def render(self, context):
+        # avoid a circular import, models use the functions above
+        from videoanalytics.main.models import QuizTopicScore
+
         u = context[self.user]
         cls = context[self.quiz_class]
+        hierarchy = u.profile.default_hierarchy()
 
-        blocks = get_quizzes_by_css_class(u.profile.default_hierarchy(), cls)
-        topics = get_quiz_summary_by_category(blocks, u)
+        if cls == QuizTopicScore.quiz_class:
+            topics = QuizTopicScore.topics(u, hierarchy)
+        else:
+            blocks = get_quizzes_by_css_class(hierarchy, cls)
+            topics = get_quiz_summary_by_category(blocks, u)
         context[self.var_name] = sorted(
             topics.values(),
             key=lambda x: (x['passed'], x['explanation']))
@@ -65,21 +133,38 @@ def quizsummary(parser, token):
     return GetQuizSummary(user, quiz_class, var_name)
 
 
-def is_question_complete(question, user):
-    answers = question.correct_answer_values()
-    if len(answers) == 0:
-        # No "correct" values for this question
-        return True
+class QuizCompletion(object):
+    """is_quiz_complete for one user and several quizzes, from two queries
+    made on the first check: the questions with correct answers, and the
+    questions answered in the user's latest submission to each quiz."""
 
-    responses = question.user_responses(user)
-    return len(responses) > 0
+    def __init__(self, quizzes, user):
+        self.quiz_ids = set(quiz.id for quiz in quizzes)
+        self.user = user
+        self.required = None
+        self.answered = None
+
+    def covers(self, quiz):
+        return quiz.id in self.quiz_ids
+
+    def load(self):
+        self.required = {}
+        for quiz_id, question_id in Answer.objects.filter(
+                question__quiz__in=self.quiz_ids, correct=True).values_list(
+                'question__quiz_id', 'question_id').distinct():
+            self.required.setdefault(quiz_id, set()).add(question_id)
+
+        self.answered = latest_responses([self.user.id], self.quiz_ids)
+
+    def is_complete(self, quiz):
+        if self.required is None:
+            self.load()
+        return self.required.get(quiz.id, set()).issubset(
+            self.answered.get((self.user.id, quiz.id), {}))
 
 
 def is_quiz_complete(quiz, user):
-    complete = True
-    for question in quiz.question_set.all():
-        complete = complete and is_question_complete(question, user)
-    return complete
+    return QuizCompletion([quiz], user).is_complete(quiz)
 
 
 class IfQuizCompleteNode(template.Node):
@@ -92,7 +177,12 @@ class IfQuizCompleteNode(template.Node):
         quiz = context[self.quiz]
         user = context['request'].user
 
-        if is_quiz_complete(quiz, user):
+        # the page view's checker covers every quiz on the page
+        completion = context.get('quiz_completion')
+        if completion is None or not completion.covers(quiz):
+            completion = QuizCompletion([quiz], user)
+
+        if completion.is_complete(quiz):
             return self.nodelist_true.render(context)
         elif self.nodelist_false is not None:
             return self.nodelist_false.render(context)
@@ -0,0 +1,95 @@
+from io import BytesIO
+
+import numpy as np
+from django.test import TestCase
+from pagetree.models import Hierarchy, UserPageVisit
+from pagetree.tests.factories import ModuleFactory, UserFactory
+from quizblock.models import Quiz, Question, Answer, Submission, Response
+
+from videoanalytics.main.columnar import COLUMNS_KEY, report_arrays, \
+    write_npz
+from videoanalytics.main.models import QuizSummaryBlock, UserVideoView, \
+    VideoAnalyticsReport, YouTubeBlock
+
+
+class ColumnarReportTest(TestCase):
+
+    def setUp(self):
+        ModuleFactory('a', '/pages/a/')
+        ModuleFactory('b', '/pages/b/')
+        self.hierarchies = [Hierarchy.objects.get(name='a'),
+                            Hierarchy.objects.get(name='b')]
+
+        video = YouTubeBlock.objects.create(video_id='avideo', title='Title')
+        section = self.hierarchies[0].get_root().get_next()
+        section.append_pageblock('Video', '', content_object=video)
+
+        quiz = Quiz.objects.create()
+        section = self.hierarchies[1].get_root().get_next()
+        section.append_pageblock('Quiz', 'assessment', content_object=quiz)
+        section.append_pageblock('Summary', '',
+                                 content_object=QuizSummaryBlock.objects
+                                 .create(quiz_class='assessment'))
+        question = Question.objects.create(
+            quiz=quiz, text='one', question_type='single choice',
+            css_extra='thermodynamics')
+        answer = Answer.objects.create(question=question, label='a',
+                                       value='a', correct=True)
+
+        self.participant = UserFactory()
+        UserVideoView.objects.create(user=self.participant,
+                                     video_id='avideo',
+                                     seconds_viewed=50, video_duration=200)
+        UserPageVisit.objects.create(
+            user=self.participant,
+            section=self.hierarchies[0].get_root().get_next())
+
+        self.participant2 = UserFactory()
+        self.participant2.profile.research_group = 'b'
+        self.participant2.profile.save()
+        s = Submission.objects.create(quiz=quiz, user=self.participant2)
+        Response.objects.create(question=question, submission=s, value='a')
+        self.answer = answer
+
+        self.report = VideoAnalyticsReport()
+
+    def test_typed_columns(self):
+        arrays = report_arrays(self.report, self.hierarchies)
+        columns = list(arrays[COLUMNS_KEY])
+        self.assertEquals(columns[:6],
+                          ['participant_id', 'research_group',
+                           'percent_complete', 'first_access',
+                           'last_access', 'avideo'])
+
+        self.assertEquals(list(arrays['participant_id']),
+                          [self.participant.username,
+                           self.participant2.username])
+        self.assertEquals(arrays['percent_complete'].dtype, np.int64)
+        self.assertEquals(list(arrays['percent_complete']), [25, 0])
+
+        self.assertEquals(arrays['avideo'].dtype, np.float64)
+        self.assertEquals(arrays['avideo'][0], 25.0)
+        self.assertTrue(np.isnan(arrays['avideo'][1]))
+
+        first = arrays['first_access']
+        self.assertEquals(first.dtype, np.dtype('datetime64[us]'))
+        self.assertFalse(np.isnat(first[0]))
+        self.assertTrue(np.isnat(first[1]))
+
+        # control group & scored participants
+        scores = arrays['thermodynamics']
+        self.assertTrue(np.isnan(scores[0]))
+        self.assertEquals(scores[1], 1.0)
+
+        # the question column is written as in the csv
+        self.assertEquals(list(arrays[columns[6]]),
+                          ['', str(self.answer.id)])
+
+    def test_write_npz(self):
+        fh = BytesIO()
+        write_npz(fh, self.report, self.hierarchies)
+        fh.seek(0)
+
+        archive = np.load(fh)
+        self.assertEquals(len(archive[COLUMNS_KEY]), 12)
+        self.assertEquals(list(archive['percent_complete']), [25, 0])
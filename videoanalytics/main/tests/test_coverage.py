@@ -0,0 +1,39 @@
+from django.test import TestCase
+
+from videoanalytics.main.coverage import count_seconds, mark_seconds, \
+    watched_intervals
+
+
+class CoverageTest(TestCase):
+
+    def test_mark_seconds(self):
+        bitmap, added = mark_seconds(b'', 0, 3)
+        self.assertEquals(bitmap, b'\xe0')
+        self.assertEquals(added, 3)
+
+        # overlapping seconds are only counted once
+        bitmap, added = mark_seconds(bitmap, 2, 10)
+        self.assertEquals(bitmap, b'\xff\xc0')
+        self.assertEquals(added, 7)
+
+        bitmap, added = mark_seconds(bitmap, 5, 5)
+        self.assertEquals(bitmap, b'\xff\xc0')
+        self.assertEquals(added, 0)
+
+        # within one byte, and across whole bytes
+        self.assertEquals(mark_seconds(b'', 9, 11), (b'\x00\x60', 2))
+        bitmap, added = mark_seconds(b'\x0f\x00\x00\x81', 2, 31)
+        self.assertEquals(bitmap, b'\x3f\xff\xff\xff')
+        self.assertEquals(added, 24)
+
+    def test_count_seconds(self):
+        self.assertEquals(count_seconds(b''), 0)
+        self.assertEquals(count_seconds(b'\xff\xc0'), 10)
+        self.assertEquals(count_seconds(bytearray(b'\x81\x01')), 3)
+
+    def test_watched_intervals(self):
+        self.assertEquals(watched_intervals(b''), [])
+
+        bitmap = mark_seconds(b'', 3, 5)[0]
+        bitmap = mark_seconds(bitmap, 10, 16)[0]
+        self.assertEquals(watched_intervals(bitmap), [(3, 5), (10, 16)])
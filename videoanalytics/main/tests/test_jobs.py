@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from pagetree.tests.factories import ModuleFactory, UserFactory
+
+from videoanalytics.main import jobs
+from videoanalytics.main.jobs import claim_job, report_rows, run_job
+from videoanalytics.main.models import ReportJob
+
+
+class ReportJobTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(REPORT_JOB_ROOT=self.media_root)
+        self.settings.enable()
+
+        ModuleFactory('a', '/pages/a/')
+        self.participant = UserFactory()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_claim_job(self):
+        self.assertIsNone(claim_job())
+
+        first = ReportJob.objects.create(report_type='key')
+        second = ReportJob.objects.create(report_type='values')
+
+        job = claim_job()
+        self.assertEquals(job, first)
+        self.assertEquals(job.status, ReportJob.RUNNING)
+        self.assertIsNotNone(job.started)
+
+        self.assertEquals(claim_job(), second)
+        self.assertIsNone(claim_job())
+
+    def test_run_job(self):
+        ReportJob.objects.create(report_type='values')
+        self.assertTrue(run_job(claim_job()))
+
+        job = ReportJob.objects.get()
+        self.assertEquals(job.status, ReportJob.COMPLETE)
+        self.assertEquals(job.percent_complete(), 100)
+        self.assertEquals(job.rows_written, 2)
+        self.assertTrue(job.artifact.name.startswith('reports/'))
+        self.assertTrue(job.artifact.path.startswith(self.media_root))
+        with self.assertRaises(ValueError):
+            job.artifact.url
+
+        lines = job.artifact.read().decode('utf-8').splitlines()
+        self.assertEquals(lines[0].split(',')[0], 'participant_id')
+        self.assertEquals(lines[1].split(',')[0], self.participant.username)
+
+    def test_run_job_failed(self):
+        ReportJob.objects.create(report_type='key')
+
+        def fail(report_type):
+            raise ValueError('no report')
+
+        jobs.report_rows = fail
+        try:
+            with self.assertRaises(ValueError):
+                run_job(claim_job())
+        finally:
+            jobs.report_rows = report_rows
+
+        job = ReportJob.objects.get()
+        self.assertEquals(job.status, ReportJob.FAILED)
+        self.assertTrue('no report' in job.error)
+
+    def test_run_job_stale(self):
+        ReportJob.objects.create(report_type='key')
+
+        def rows(report_type):
+            # the job is taken as stale while this worker builds it
+            ReportJob.objects.update(status=ReportJob.FAILED)
+            return report_rows(report_type)
+
+        jobs.report_rows = rows
+        try:
+            self.assertFalse(run_job(claim_job()))
+        finally:
+            jobs.report_rows = report_rows
+
+        job = ReportJob.objects.get()
+        self.assertEquals(job.status, ReportJob.FAILED)
+        self.assertFalse(job.artifact)
+        self.assertEquals(os.listdir(os.path.join(self.media_root,
+                                                  'reports')), [])
@@ -1,9 +1,13 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils.six import StringIO
 from pagetree.models import Hierarchy, UserPageVisit, Section
 from pagetree.tests.factories import UserFactory, ModuleFactory
+from quizblock.models import Quiz, Question, Answer, Submission, Response
 from quizblock.tests.test_models import FakeReq
 from videoanalytics.main.models import UserVideoView, \
-    QuizSummaryBlock, YouTubeBlock
+    QuizSummaryBlock, QuizTopicScore, YouTubeBlock
 from videoanalytics.main.tests.factories import QuizSummaryBlockFactory, \
     YouTubeBlockFactory
 
@@ -116,6 +120,183 @@ class UserVideoViewTest(TestCase):
         uvv.seconds_viewed = 200
         self.assertEquals(uvv.percent_viewed(), 200.0)
 
+    def test_record_view(self):
+        UserVideoView.record_view(self.user.id, 'ABCDEFG', 100, 5)
+        uvv = UserVideoView.objects.get(user=self.user, video_id='ABCDEFG')
+        self.assertEquals(uvv.video_duration, 100)
+        self.assertEquals(uvv.seconds_viewed, 5)
+
+        with self.assertNumQueries(1):
+            UserVideoView.record_view(self.user.id, 'ABCDEFG', 101, 6)
+
+        uvv.refresh_from_db()
+        self.assertEquals(uvv.video_duration, 101)
+        self.assertEquals(uvv.seconds_viewed, 11)
+
+    def test_record_view_lost_race(self):
+        # the row appears between the update and the insert
+        original = UserVideoView._increment
+
+        def increment(cls, *args):
+            if not UserVideoView.objects.filter(user=self.user).exists():
+                UserVideoView.objects.create(
+                    user=self.user, video_id='ABCDEFG',
+                    video_duration=100, seconds_viewed=5)
+                return 0
+            return original(*args)
+
+        # a classmethod, a plain function is an unbound method on py2
+        self.addCleanup(setattr, UserVideoView, '_increment',
+                        UserVideoView.__dict__['_increment'])
+        UserVideoView._increment = classmethod(increment)
+        UserVideoView.record_view(self.user.id, 'ABCDEFG', 100, 5)
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='ABCDEFG')
+        self.assertEquals(uvv.seconds_viewed, 10)
+
+    def test_mark_watched(self):
+        uvv = UserVideoView(user=self.user,
+                            video_id='ABCDEFG',
+                            video_duration=20)
+        self.assertEquals(uvv.coverage_percent(), 0)
+
+        uvv.mark_watched([(0, 5), (5, 10)])
+        uvv.seconds_viewed = 10
+        self.assertEquals(uvv.unique_seconds, 10)
+        self.assertEquals(uvv.coverage_percent(), 50.0)
+
+        # re-watching a segment does not increase the coverage
+        uvv.mark_watched([(0, 10)])
+        uvv.seconds_viewed += 10
+        self.assertEquals(uvv.percent_viewed(), 100.0)
+        self.assertEquals(uvv.coverage_percent(), 50.0)
+
+        # positions outside the video are ignored
+        uvv.mark_watched([(-5, 0), (15, 30)])
+        self.assertEquals(uvv.coverage_percent(), 75.0)
+        self.assertEquals(uvv.watched_intervals(), [(0, 10), (15, 20)])
+
+        uvv.save()
+        uvv.refresh_from_db()
+        self.assertEquals(uvv.watched_intervals(), [(0, 10), (15, 20)])
+
+
+class QuizTopicScoreTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        ModuleFactory('one', '/pages/one/')
+        self.hierarchy = Hierarchy.objects.get(name='one')
+
+        self.quiz = Quiz.objects.create()
+        section = Section.objects.get(slug='one')
+        section.append_pageblock('Q', 'assessment', content_object=self.quiz)
+
+        self.question = Question.objects.create(
+            quiz=self.quiz, text='one', question_type='single choice',
+            css_extra='t1', explanation='a')
+        Answer.objects.create(question=self.question, label='a',
+                              value='a', correct=True)
+        Answer.objects.create(question=self.question, label='b', value='b')
+
+    def test_topics(self):
+        topics = QuizTopicScore.topics(self.user, self.hierarchy)
+        self.assertEquals(topics, QuizTopicScore.summarize(
+            self.user, self.hierarchy))
+        self.assertEquals(topics['t1']['score'], 0)
+
+        row = QuizTopicScore.objects.get(user=self.user)
+        self.assertEquals(row.topic, 't1')
+        self.assertFalse(row.stale)
+
+        # stored scores are read back in a single query
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                QuizTopicScore.topics(self.user, self.hierarchy), topics)
+
+    def test_empty(self):
+        ModuleFactory('two', '/pages/two/')
+        hierarchy = Hierarchy.objects.get(name='two')
+        self.assertEquals(QuizTopicScore.topics(self.user, hierarchy), {})
+        self.assertEquals(QuizTopicScore.objects.get(
+            user=self.user, hierarchy=hierarchy).score, QuizTopicScore.EMPTY)
+
+        # stored too, not recomputed on each read
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                QuizTopicScore.topics(self.user, hierarchy), {})
+
+    def test_check_command(self):
+        # a participant outside the control group
+        ModuleFactory('b', '/pages/b/')
+        Hierarchy.objects.get(name='b').get_root().get_first_child() \
+            .append_pageblock('Q', 'assessment', content_object=self.quiz)
+        self.user.profile.research_group = 'b'
+        self.user.profile.save()
+        Submission.objects.create(quiz=self.quiz, user=self.user)
+        with self.assertRaises(CommandError):
+            call_command('quiz_topic_scores', check=True, stdout=StringIO())
+
+        call_command('quiz_topic_scores', stdout=StringIO())
+        call_command('quiz_topic_scores', check=True, stdout=StringIO())
+
+        QuizTopicScore.objects.update(stale=True)
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('quiz_topic_scores', check=True, stdout=out)
+        self.assertTrue(out.getvalue().startswith('stale: '))
+
+        QuizTopicScore.objects.update(stale=False, score=5)
+        with self.assertRaises(CommandError):
+            call_command('quiz_topic_scores', check=True, stdout=StringIO())
+
+    def test_stale(self):
+        QuizTopicScore.refresh(self.user, self.hierarchy)
+
+        submission = Submission.objects.create(quiz=self.quiz, user=self.user)
+        self.assertTrue(QuizTopicScore.objects.get(user=self.user).stale)
+
+        QuizTopicScore.refresh(self.user, self.hierarchy)
+        Response.objects.create(question=self.question,
+                                submission=submission, value='a')
+        self.assertTrue(QuizTopicScore.objects.get(user=self.user).stale)
+
+        topics = QuizTopicScore.topics(self.user, self.hierarchy)
+        self.assertEquals(topics['t1']['score'], 1)
+        self.assertFalse(QuizTopicScore.objects.get(user=self.user).stale)
+
+        submission.delete()
+        self.assertEquals(QuizTopicScore.topics(
+            self.user, self.hierarchy)['t1']['score'], 0)
+
+    def test_stale_on_response_delete(self):
+        submission = Submission.objects.create(quiz=self.quiz, user=self.user)
+        response = Response.objects.create(
+            question=self.question, submission=submission, value='a')
+        QuizTopicScore.refresh(self.user, self.hierarchy)
+
+        response.delete()
+        self.assertTrue(QuizTopicScore.objects.get(user=self.user).stale)
+
+    def test_stale_on_content_edit(self):
+        submission = Submission.objects.create(quiz=self.quiz, user=self.user)
+        Response.objects.create(question=self.question,
+                                submission=submission, value='b')
+        self.assertEquals(QuizTopicScore.topics(
+            self.user, self.hierarchy)['t1']['score'], 0)
+
+        Answer.objects.filter(value='a').delete()
+        answer = Answer.objects.get(value='b')
+        answer.correct = True
+        answer.save()
+        self.assertEquals(QuizTopicScore.topics(
+            self.user, self.hierarchy)['t1']['score'], 1)
+
+        self.question.css_extra = 't2'
+        self.question.save()
+        self.assertEquals(list(QuizTopicScore.topics(
+            self.user, self.hierarchy).keys()), ['t2'])
+
 
 class QuizSummaryBlockTest(TestCase):
 
@@ -0,0 +1,21 @@
+from django.test import TestCase
+
+from videoanalytics.main.pagebudget import PAGE_QUERY_BUDGETS, \
+    build_course, course_pages, measure_pages
+
+
+class PageQueryBudgetTest(TestCase):
+
+    def setUp(self):
+        build_course()
+
+    def test_budgets(self):
+        pages = course_pages()
+        self.assertEquals(sorted(p[0] for p in pages),
+                          sorted(PAGE_QUERY_BUDGETS.keys()))
+
+        for page_type, queries, seconds in measure_pages(pages):
+            self.assertTrue(
+                queries <= PAGE_QUERY_BUDGETS[page_type],
+                '%s took %d queries, the budget is %d' % (
+                    page_type, queries, PAGE_QUERY_BUDGETS[page_type]))
@@ -1,9 +1,18 @@
+import csv
+
 from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
 from pagetree.helpers import get_hierarchy
 from pagetree.models import UserPageVisit, Hierarchy
+from pagetree.reports import PagetreeReport
 from pagetree.tests.factories import UserFactory, ModuleFactory
+from quizblock.models import Quiz, Question, Answer, Submission, Response
+from videoanalytics.main.export import check_content_version, \
+    export_values, merge_delta, parse_watermark, user_shards
 from videoanalytics.main.models import VideoAnalyticsReport, \
-    YouTubeBlock, YouTubeReportColumn, UserVideoView
+    YouTubeBlock, YouTubeReportColumn, UserVideoView, QuizSummaryBlock
+from videoanalytics.main.structure import structure_version
 
 
 class YouTubeReportColumnTest(TestCase):
@@ -55,17 +64,18 @@ class VideoAnalyticsReportTest(TestCase):
         self.participant = UserFactory()
         self.participant2 = UserFactory()
 
-        block = YouTubeBlock()
-        block.video_id = 'avideo'
-        block.language = 'a'
-        block.title = 'Title'
-        block.save()
+        self.block = YouTubeBlock()
+        self.block.video_id = 'avideo'
+        self.block.language = 'a'
+        self.block.title = 'Title'
+        self.block.save()
 
         ModuleFactory("a", "/pages/a/")
         self.hierarchy_a = Hierarchy.objects.get(name='a')
 
         section = self.hierarchy_a.get_root().get_next()
-        section.append_pageblock('Video 1', '', content_object=block)
+        section.append_pageblock('Video 1', '',
+                                 content_object=self.block)
 
         sections = self.hierarchy_a.get_root().get_descendants()
         UserPageVisit.objects.create(user=self.participant,
@@ -125,6 +135,69 @@ class VideoAnalyticsReportTest(TestCase):
         except StopIteration:
             pass  # expected
 
+    def test_columns_cached(self):
+        rows = list(self.report.metadata([self.hierarchy_a]))
+        columns = self.report.value_columns([self.hierarchy_a])
+
+        # each checks the content version
+        with self.assertNumQueries(2):
+            self.assertEquals(
+                list(self.report.metadata([self.hierarchy_a])), rows)
+            self.assertEquals(
+                self.report.value_columns([self.hierarchy_a])[5:],
+                columns[5:])
+
+        # editing the content discards them
+        self.block.title = 'New Title'
+        self.block.save()
+        rows = list(self.report.metadata([self.hierarchy_a]))
+        self.assertEquals(rows[-1][4], 'New Title')
+
+        quiz = Quiz.objects.create()
+        section = self.hierarchy_a.get_root().get_first_leaf()
+        section.append_pageblock('Quiz', '', content_object=quiz)
+        question = Question.objects.create(
+            quiz=quiz, text='question', question_type='short text')
+        self.assertEquals(
+            len(self.report.value_columns([self.hierarchy_a])), 7)
+
+        question.text = 'edited question'
+        question.save()
+        rows = list(self.report.metadata([self.hierarchy_a]))
+        self.assertTrue(['a', '%d_%d' % (self.hierarchy_a.id, question.id),
+                         'Quiz', 'short text', b'edited question'] in rows)
+
+    def test_report_blocks(self):
+        quiz = Quiz.objects.create()
+        question = Question.objects.create(
+            quiz=quiz, text='question', question_type='multiple choice')
+        Answer.objects.create(question=question, label='one', value='1')
+        Answer.objects.create(question=question, label='two', value='2')
+        video = YouTubeBlock.objects.create(video_id='bvideo', title='B')
+
+        sections = self.hierarchy_a.get_root().get_descendants()
+        sections[0].append_pageblock('Quiz', '', content_object=quiz)
+        sections[2].append_pageblock('Video 2', '', content_object=video)
+        self.hierarchy_a.get_root().append_pageblock(
+            'Not a page', '', content_object=YouTubeBlock.objects.create(
+                video_id='cvideo', title='C'))
+
+        # the content version, the pageblocks, then two for each block
+        # type & two for questions
+        with self.assertNumQueries(8):
+            columns = self.report.block_columns(
+                [self.hierarchy_a], 'report_values')
+
+        self.assertEquals(self.report.report_blocks([self.hierarchy_a]),
+                          [self.block, quiz, video])
+        self.assertEquals([c.identifier() for c in columns], [
+            'avideo', '%d_%d_%d' % (self.hierarchy_a.id, question.id,
+                                    question.answer_set.first().id),
+            '%d_%d_%d' % (self.hierarchy_a.id, question.id,
+                          question.answer_set.last().id),
+            'bvideo'])
+        self.assertEquals(columns[0].hierarchy, self.hierarchy_a)
+
     def test_values(self):
         rows = self.report.values([self.hierarchy_a])
         header = ['participant_id', 'research_group',
@@ -152,3 +225,225 @@ class VideoAnalyticsReportTest(TestCase):
             next(rows)
         except StopIteration:
             pass  # expected
+
+
+class BulkValuesTest(TestCase):
+
+    def setUp(self):
+        super(BulkValuesTest, self).setUp()
+
+        ModuleFactory("a", "/pages/a/")
+        ModuleFactory("b", "/pages/b/")
+        self.hierarchy_a = Hierarchy.objects.get(name='a')
+        self.hierarchy_b = Hierarchy.objects.get(name='b')
+
+        video = YouTubeBlock.objects.create(video_id='avideo', title='Title')
+        section = self.hierarchy_a.get_root().get_next()
+        section.append_pageblock('Video 1', '', content_object=video)
+
+        self.quiz = Quiz.objects.create()
+        section = self.hierarchy_b.get_root().get_next()
+        section.append_pageblock('Quiz', 'assessment',
+                                 content_object=self.quiz)
+        section.append_pageblock('Summary', '',
+                                 content_object=QuizSummaryBlock.objects
+                                 .create(quiz_class='assessment'))
+
+        self.single = Question.objects.create(
+            quiz=self.quiz, text='one', question_type='single choice',
+            css_extra='thermodynamics')
+        Answer.objects.create(question=self.single, label='a', value='a',
+                              correct=True)
+        Answer.objects.create(question=self.single, label='b', value='b')
+
+        self.multiple = Question.objects.create(
+            quiz=self.quiz, text='two', question_type='multiple choice',
+            css_extra='mechanisms')
+        Answer.objects.create(question=self.multiple, label='a', value='a',
+                              correct=True)
+        Answer.objects.create(question=self.multiple, label='b', value='b')
+
+        self.text = Question.objects.create(
+            quiz=self.quiz, text='three', question_type='short text',
+            css_extra='mechanisms')
+
+        self.participant = UserFactory()
+        UserVideoView.objects.create(user=self.participant,
+                                     video_id='avideo',
+                                     seconds_viewed=50,
+                                     video_duration=200)
+
+        self.participant2 = UserFactory()
+        self.participant2.profile.research_group = 'b'
+        self.participant2.profile.save()
+        s = Submission.objects.create(quiz=self.quiz, user=self.participant2)
+        Response.objects.create(question=self.single, submission=s,
+                                value='a')
+        Response.objects.create(question=self.multiple, submission=s,
+                                value='b')
+        Response.objects.create(question=self.text, submission=s,
+                                value='some text')
+
+        self.participant3 = UserFactory()
+        self.participant3.profile.research_group = 'b'
+        self.participant3.profile.save()
+
+        # participant2 visited pages in both hierarchies
+        sections_a = self.hierarchy_a.get_root().get_descendants()
+        sections_b = self.hierarchy_b.get_root().get_descendants()
+        for section in sections_a[:2]:
+            UserPageVisit.objects.create(user=self.participant,
+                                         section=section)
+        UserPageVisit.objects.create(user=self.participant2,
+                                     section=sections_a[0])
+        UserPageVisit.objects.create(user=self.participant2,
+                                     section=sections_b[0])
+
+        self.report = VideoAnalyticsReport()
+
+    def test_values_match_per_cell_evaluation(self):
+        hierarchies = [self.hierarchy_a, self.hierarchy_b]
+        expected = list(PagetreeReport.values(self.report, hierarchies))
+        self.assertEquals(list(self.report.values(hierarchies)), expected)
+
+        # chunk boundaries do not affect the output
+        columns = self.report.value_columns(hierarchies)
+        chunks = list(self.report.user_chunks(chunk_size=2))
+        self.assertEquals(len(chunks), 2)
+
+        rows = [[chunk.user_value(column, user) for column in columns]
+                for chunk in chunks for user in chunk.users]
+        self.assertEquals(rows, expected[1:])
+
+    def test_bulk_values(self):
+        rows = list(self.report.values([self.hierarchy_a,
+                                        self.hierarchy_b]))
+        self.assertEquals(rows[1][5], '25.0')
+        self.assertEquals(rows[2][5], 0)
+
+        # percent complete counts visits in the user's own hierarchy
+        self.assertEquals([row[2] for row in rows[1:]], [50, 25, 0])
+        self.assertNotEquals(rows[2][3], '')
+        self.assertEquals(rows[3][3:5], ['', ''])
+
+        # quiz summary. participant2 answered the single choice and
+        # short text correctly, the multiple choice incorrectly
+        self.assertEquals(rows[1][-5:], ['-', '-', '-', '-', '-'])
+        self.assertEquals(rows[2][-5:], [1, '', '', 1, ''])
+        self.assertEquals(rows[3][-5:], ['', '', '', '', ''])
+
+    def test_constant_queries_per_chunk(self):
+        hierarchies = [self.hierarchy_a, self.hierarchy_b]
+        columns = self.report.value_columns(hierarchies)
+        chunk = next(self.report.user_chunks())
+
+        # prime the per-chunk lookups & both hierarchies' structure
+        for column in columns:
+            chunk.user_value(column, self.participant)
+            chunk.user_value(column, self.participant2)
+
+        # profile, youtube & question columns are answered from memory
+        with self.assertNumQueries(0):
+            for user in chunk.users:
+                for column in columns[:7]:
+                    chunk.user_value(column, user)
+
+    def test_memo(self):
+        hierarchies = [self.hierarchy_a, self.hierarchy_b]
+        list(self.report.values(hierarchies))
+
+        # participant2's quiz summary & the assessment blocks are computed
+        # once, then shared by the remaining four topic columns
+        self.assertEquals(self.report.memo.misses, 2)
+        self.assertEquals(self.report.memo.hits, 4)
+
+        # a new run starts empty, and reads the now stored topic scores
+        list(self.report.values(hierarchies))
+        self.assertEquals(self.report.memo.misses, 1)
+        self.assertEquals(self.report.memo.hits, 4)
+
+    def test_memo_released_per_chunk(self):
+        hierarchies = [self.hierarchy_a, self.hierarchy_b]
+        rows = self.report.values(hierarchies)
+        next(rows)  # headers
+        next(rows)
+        next(rows)  # participant2
+        self.assertTrue(self.participant2.id in
+                        [key[0] for key in self.report.memo._values])
+
+        list(rows)
+        self.assertEquals(
+            [key for key in self.report.memo._values
+             if key[0] == self.participant2.id], [])
+
+    def test_export_values(self):
+        staff = UserFactory(is_staff=True)
+        self.client.login(username=staff.username, password='test')
+        response = self.client.get('/report/', {'type': 'values'})
+        expected = b''.join(response.streaming_content).decode('utf-8')
+
+        for shards in [None, 1, 2, 3]:
+            fh = StringIO()
+            export_values(fh, shards=shards)
+            self.assertEquals(fh.getvalue(), expected)
+
+    def test_user_shards(self):
+        self.assertEquals(user_shards([], 2), [])
+        self.assertEquals(user_shards([1, 2, 5], 1), [(1, 5)])
+        self.assertEquals(user_shards([1, 2, 5], 2), [(1, 2), (5, 5)])
+        self.assertEquals(user_shards([1, 2, 5], 4),
+                          [(1, 1), (2, 2), (5, 5)])
+
+    def csv_rows(self, rows):
+        fh = StringIO()
+        csv.writer(fh).writerows(rows)
+        return list(csv.reader(StringIO(fh.getvalue())))
+
+    def test_delta_values(self):
+        hierarchies = [self.hierarchy_a, self.hierarchy_b]
+        snapshot = self.csv_rows(self.report.values(hierarchies))
+        since = timezone.now()
+
+        rows = list(self.report.delta_values(hierarchies, since))
+        self.assertEquals(rows, [snapshot[0]])
+
+        UserVideoView.record_view(self.participant3.id, 'avideo', 200, 100)
+        s = Submission.objects.create(quiz=self.quiz, user=self.participant)
+        Response.objects.create(question=self.single, submission=s,
+                                value='a')
+        newcomer = UserFactory()
+
+        delta = list(self.report.delta_values(hierarchies, since))
+        self.assertEquals([row[0] for row in delta[1:]],
+                          [self.participant.username,
+                           self.participant3.username, newcomer.username])
+
+        # the merged snapshot is the full report
+        self.assertEquals(
+            self.csv_rows(merge_delta(snapshot, delta)),
+            self.csv_rows(self.report.values(hierarchies)))
+
+    def test_merge_delta_columns_changed(self):
+        snapshot = [['participant_id', 'research_group'], ['x', 'a']]
+        with self.assertRaises(ValueError):
+            list(merge_delta(snapshot, [['participant_id']]))
+
+    def test_check_content_version(self):
+        version = structure_version()
+        check_content_version(version)
+
+        # a page added since the snapshot changes the percent complete
+        self.hierarchy_a.get_root().append_child('New', 'new')
+        with self.assertRaises(ValueError):
+            check_content_version(version)
+
+    def test_parse_watermark(self):
+        self.assertEquals(
+            parse_watermark('2018-06-01T12:00:00+00:00').isoformat(),
+            '2018-06-01T12:00:00+00:00')
+        self.assertTrue(timezone.is_aware(
+            parse_watermark('2018-06-01 12:00')))
+        with self.assertRaises(ValueError):
+            parse_watermark('yesterday')
+        with self.assertRaises(ValueError):
+            parse_watermark('2018-13-01 12:00')
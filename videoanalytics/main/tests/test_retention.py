@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.test import TestCase
+from pagetree.tests.factories import UserFactory
+
+from videoanalytics.main.coverage import mark_seconds
+from videoanalytics.main.models import UserVideoView
+from videoanalytics.main.retention import ALL_GROUPS, compute_curves, \
+    coverage_matrix, video_retention
+
+
+class RetentionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_coverage_matrix(self):
+        matrix = coverage_matrix([b'\xf0', mark_seconds(b'', 2, 10)[0], b''],
+                                 10)
+        self.assertEquals(matrix.shape, (3, 10))
+        self.assertEquals(matrix.tolist(), [
+            [1, 1, 1, 1, 0, 0, 0, 0, 0, 0],
+            [0, 0, 1, 1, 1, 1, 1, 1, 1, 1],
+            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]])
+
+    def test_compute_curves(self):
+        views = [
+            ('a', 4, b'\xf0', 4),
+            ('a', 4, b'\xc0', 2),
+            ('b', 4, b'\x80', 1),
+            ('b', 4, b'', 0)]
+        curves = compute_curves('abc', views)
+        self.assertEquals([c.research_group for c in curves],
+                          [ALL_GROUPS, 'a', 'b'])
+
+        self.assertEquals(curves[0].viewers, 4)
+        self.assertEquals(curves[0].curve, [0.75, 0.5, 0.25, 0.25])
+        self.assertEquals(curves[0].median(), 0.375)
+
+        self.assertEquals(curves[1].curve, [1.0, 1.0, 0.5, 0.5])
+        self.assertEquals(curves[1].median(), 0.75)
+        self.assertEquals(curves[2].curve, [0.5, 0, 0, 0])
+        self.assertEquals(curves[2].quantile_values(),
+                          [0.0625, 0.125, 0.1875, 0.225])
+
+    def test_video_retention(self):
+        self.assertEquals(video_retention('abc'), [])
+
+        # a view without a watched second is no viewer
+        UserVideoView.objects.create(user=UserFactory(), video_id='abc',
+                                     video_duration=10)
+        self.assertEquals(video_retention('abc'), [])
+
+        user = UserFactory()
+        uvv = UserVideoView(user=user, video_id='abc', video_duration=10)
+        uvv.mark_watched([(0, 5)])
+        uvv.save()
+
+        curves = video_retention('abc')
+        self.assertEquals(curves[0].viewers, 1)
+        self.assertEquals(curves[0].curve, [1] * 5 + [0] * 5)
+
+        # cached until the coverage changes
+        with self.assertNumQueries(1):
+            video_retention('abc')
+
+        uvv.mark_watched([(5, 10)])
+        uvv.save()
+        curves = video_retention('abc')
+        self.assertEquals(curves[0].curve, [1] * 10)
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from pagetree.models import Hierarchy
+from pagetree.tests.factories import ModuleFactory, UserFactory
+
+from videoanalytics.main.models import ContentVersion
+from videoanalytics.main.structure import hierarchy_metadata
+
+
+class HierarchyMetadataTest(TestCase):
+
+    def setUp(self):
+        ModuleFactory('one', '/pages/one/')
+        self.hierarchy = Hierarchy.objects.get(name='one')
+        self.root = self.hierarchy.get_root()
+
+    def test_metadata(self):
+        metadata = hierarchy_metadata('one')
+        self.assertEquals(metadata.hierarchy, self.hierarchy)
+        self.assertEquals(metadata.root, self.root)
+        self.assertEquals(metadata.first_child, self.root.get_first_child())
+        self.assertEquals(metadata.last_leaf,
+                          self.hierarchy.get_last_leaf(self.root))
+        self.assertEquals(metadata.page_count, 4)
+
+        # only the content version is read
+        with self.assertNumQueries(1):
+            self.assertEquals(hierarchy_metadata('one'), metadata)
+
+    def test_cleared_on_edit(self):
+        metadata = hierarchy_metadata('one')
+
+        section = self.root.append_child('Five', 'five')
+        self.assertEquals(hierarchy_metadata('one').page_count, 5)
+        self.assertEquals(hierarchy_metadata('one').last_leaf, section)
+
+        # reordering saves no section, pagetree clears its caches instead
+        metadata = hierarchy_metadata('one')
+        children = list(self.root.get_children())
+        self.root.update_children_order(
+            [children[-1].id] + [c.id for c in children[:-1]])
+        self.assertNotEqual(hierarchy_metadata('one'), metadata)
+        self.assertEquals(hierarchy_metadata('one').first_child, section)
+
+    def test_changed_elsewhere(self):
+        metadata = hierarchy_metadata('one')
+
+        # another process replaced the token, leaving this one's entries
+        ContentVersion.objects.update(token='other')
+        self.assertNotEqual(hierarchy_metadata('one'), metadata)
+
+    def test_profile(self):
+        user = UserFactory()
+        user.profile.research_group = 'one'
+        user.profile.save()
+
+        hierarchy_metadata('one')
+        with self.assertNumQueries(3):
+            self.assertEquals(user.profile.default_hierarchy(),
+                              self.hierarchy)
+            self.assertEquals(user.profile.default_location(), self.root)
+            self.assertFalse(user.profile.in_control_group())
@@ -8,7 +8,8 @@ from quizblock.tests.test_templatetags import MockNodeList
 
 from videoanalytics.main.templatetags.accessible import AccessibleNode
 from videoanalytics.main.templatetags.quizsummary import IfQuizCompleteNode, \
-    GetQuizSummary
+    GetQuizSummary, QuizCompletion, QuizScores, get_quizzes_by_css_class, \
+    is_quiz_complete, latest_responses
 
 
 class TestAccessible(TestCase):
@@ -145,6 +146,55 @@ class IfQuizCompleteTest(TestCase):
         Response.objects.create(question=ques2, submission=s, value='b')
         self.assert_render_true()
 
+    def make_quiz(self, questions):
+        quiz = Quiz.objects.create()
+        for i in range(questions):
+            question = Question.objects.create(
+                quiz=quiz, text='question %d' % i,
+                question_type='single choice')
+            Answer.objects.create(question=question, label='a', value='a',
+                                  correct=True)
+            Answer.objects.create(question=question, label='b', value='b')
+        return quiz
+
+    def answer(self, quiz, questions):
+        s = Submission.objects.create(quiz=quiz, user=self.user)
+        for question in questions:
+            Response.objects.create(question=question, submission=s,
+                                    value='b')
+
+    def test_quiz_complete_queries(self):
+        self.quiz = self.make_quiz(30)
+        self.answer(self.quiz, self.quiz.question_set.all())
+
+        with self.assertNumQueries(2):
+            self.assert_render_true()
+
+    def test_latest_submission(self):
+        self.quiz = self.make_quiz(2)
+        questions = list(self.quiz.question_set.all())
+
+        self.answer(self.quiz, questions)
+        self.answer(self.quiz, questions[:1])
+        self.assertFalse(is_quiz_complete(self.quiz, self.user))
+
+        self.answer(self.quiz, questions)
+        self.assertTrue(is_quiz_complete(self.quiz, self.user))
+
+    def test_page_quizzes(self):
+        quizzes = [self.make_quiz(3), self.make_quiz(3), Quiz.objects.create()]
+        self.answer(quizzes[0], quizzes[0].question_set.all())
+        self.answer(quizzes[1], quizzes[1].question_set.all()[:2])
+
+        completion = QuizCompletion(quizzes, self.user)
+        with self.assertNumQueries(2):
+            self.assertEquals(
+                [completion.is_complete(quiz) for quiz in quizzes],
+                [True, False, True])
+
+        self.assertTrue(completion.covers(quizzes[1]))
+        self.assertFalse(completion.covers(self.quiz))
+
 
 class QuizSummaryTest(TestCase):
 
@@ -242,3 +292,71 @@ class QuizSummaryTest(TestCase):
         self.assertEquals(ctx['results'][1]['title'], 't1')
         self.assertEquals(ctx['results'][1]['score'], 3)
         self.assertTrue(ctx['results'][1]['passed'])
+
+    def submit(self, user, responses):
+        s = Submission.objects.create(quiz=self.quiz, user=user)
+        for question, value in responses:
+            Response.objects.create(question=question, submission=s,
+                                    value=value)
+
+    def test_latest_responses(self):
+        other = UserFactory()
+        self.submit(self.user, [(self.ques1, 'b')])
+        self.submit(self.user, [(self.ques1, 'a'), (self.ques2, 'b')])
+        self.submit(other, [(self.ques1, 'a')])
+        self.submit(other, [])
+
+        key = (self.user.id, self.quiz.id)
+        self.assertEquals(
+            latest_responses([self.user.id, other.id]),
+            {key: {self.ques1.id: ['a'], self.ques2.id: ['b']},
+             (other.id, self.quiz.id): {}})
+        self.assertEquals(latest_responses([self.user.id], []), {})
+
+    def summary_by_question(self, blocks, user):
+        # the per-question computation QuizScores replaces
+        topics = {}
+        for b in blocks:
+            for question in b.content_object.question_set.all():
+                topic = topics.setdefault(question.css_extra, {
+                    'title': question.css_extra,
+                    'explanation': question.explanation,
+                    'score': 0, 'passed': 0})
+                if question.is_user_correct(user):
+                    topic['score'] += 1
+                    topic['passed'] = 1 if topic['score'] > 1 else 0
+        return topics
+
+    def test_quiz_scores(self):
+        multiple = Question.objects.create(
+            quiz=self.quiz, text='five', question_type='multiple choice',
+            css_extra='t2', explanation='b')
+        for value in 'abc':
+            Answer.objects.create(question=multiple, label=value,
+                                  value=value, correct=(value != 'c'))
+        text = Question.objects.create(
+            quiz=self.quiz, text='six', question_type='short text',
+            css_extra='t3', explanation='c')
+
+        users = [self.user] + [UserFactory() for i in range(5)]
+        self.submit(users[1], [(self.ques1, 'a'), (self.ques2, 'a'),
+                               (multiple, 'a'), (multiple, 'b')])
+        self.submit(users[2], [(self.ques1, 'a'), (self.ques2, 'a')])
+        self.submit(users[2], [(self.ques1, 'b'), (multiple, 'a'),
+                               (text, 'anything')])
+        self.submit(users[3], [(multiple, 'a'), (multiple, 'c')])
+        self.submit(users[4], [(multiple, 'a'), (multiple, 'a'),
+                               (self.ques3, 'a'), (self.ques2, 'a')])
+        self.submit(users[5], [])
+
+        blocks = list(get_quizzes_by_css_class(
+            self.quiz.pageblock().section.hierarchy, 'assessment'))
+
+        with self.assertNumQueries(3):
+            scores = QuizScores(blocks, [u.id for u in users])
+            summaries = [scores.summary(u.id) for u in users]
+
+        for user, summary in zip(users, summaries):
+            expected = self.summary_by_question(blocks, user)
+            self.assertEquals(list(summary.items()), list(expected.items()))
+        self.assertEquals(summaries[1]['t1']['passed'], 1)
@@ -0,0 +1,195 @@
+import threading
+
+from django.db import connection, DatabaseError
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from pagetree.tests.factories import UserFactory
+
+from videoanalytics.main import tracking
+from videoanalytics.main.models import UserVideoView
+from videoanalytics.main.tracking import HeartbeatBuffer, heartbeat_buffer, \
+    parse_span, record_heartbeat, write_deltas
+
+
+class HeartbeatBufferTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.user2 = UserFactory()
+
+    def test_coalesce(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=100)
+        buf.flusher = object()  # no background flushes
+
+        buf.add(self.user.id, 'abc', 100, 5)
+        buf.add(self.user.id, 'abc', 101, 5)
+        buf.add(self.user2.id, 'abc', 100, 4)
+        self.assertFalse(UserVideoView.objects.exists())
+        self.assertEquals(buf.pending[(self.user.id, 'abc')], (101, 10))
+
+        buf.flush()
+        self.assertEquals(buf.pending, {})
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='abc')
+        self.assertEquals(uvv.video_duration, 101)
+        self.assertEquals(uvv.seconds_viewed, 10)
+
+        uvv = UserVideoView.objects.get(user=self.user2, video_id='abc')
+        self.assertEquals(uvv.seconds_viewed, 4)
+
+    def test_flush_on_event_count(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=2)
+        buf.flusher = object()
+
+        buf.add(self.user.id, 'abc', 100, 5)
+        self.assertFalse(UserVideoView.objects.exists())
+        buf.add(self.user.id, 'abc', 100, 5)
+        self.assertEquals(
+            UserVideoView.objects.get(user=self.user).seconds_viewed, 10)
+
+    def test_one_flusher(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=100)
+        runs = []
+        buf.run = lambda: runs.append(1)
+
+        starters = [threading.Thread(target=buf.start) for i in range(8)]
+        for starter in starters:
+            starter.start()
+        for starter in starters:
+            starter.join()
+        buf.flusher.join()
+        self.assertEquals(runs, [1])
+
+    def test_write_deltas(self):
+        UserVideoView.objects.create(user=self.user, video_id='abc',
+                                     video_duration=100, seconds_viewed=20)
+
+        with CaptureQueriesContext(connection) as ctx:
+            write_deltas({(self.user.id, 'abc'): (100, 5),
+                          (self.user.id, 'def'): (50, 5),
+                          (self.user2.id, 'abc'): (100, 10)})
+
+        # select, update & insert
+        statements = [q['sql'] for q in ctx.captured_queries
+                      if 'SAVEPOINT' not in q['sql']]
+        self.assertEquals(len(statements), 3)
+
+        self.assertEquals(
+            UserVideoView.objects.get(
+                user=self.user, video_id='abc').seconds_viewed, 25)
+        self.assertEquals(
+            UserVideoView.objects.get(
+                user=self.user, video_id='def').video_duration, 50)
+        self.assertEquals(
+            UserVideoView.objects.get(
+                user=self.user2, video_id='abc').seconds_viewed, 10)
+
+    def test_restore_on_failure(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=100)
+        buf.flusher = object()
+        buf.add(self.user.id, 'abc', 100, 5)
+
+        def fail(deltas, spans):
+            buf.add(self.user.id, 'abc', 100, 1)
+            raise DatabaseError()
+
+        tracking.write_deltas = fail
+        try:
+            with self.assertRaises(DatabaseError):
+                buf.flush()
+        finally:
+            tracking.write_deltas = write_deltas
+
+        # the failed seconds are merged with those received meanwhile
+        self.assertEquals(buf.pending, {(self.user.id, 'abc'): (100, 6)})
+
+    def test_failure_on_event_count(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=2)
+        buf.flusher = object()
+        buf.add(self.user.id, 'abc', 100, 5)
+
+        def fail(deltas, spans):
+            raise DatabaseError()
+
+        tracking.write_deltas = fail
+        try:
+            # logged, the request still succeeds
+            buf.add(self.user.id, 'abc', 100, 5)
+        finally:
+            tracking.write_deltas = write_deltas
+
+        self.assertEquals(buf.pending, {(self.user.id, 'abc'): (100, 10)})
+        self.assertFalse(UserVideoView.objects.exists())
+
+    def test_spans(self):
+        buf = HeartbeatBuffer(flush_seconds=3600, flush_events=100)
+        buf.flusher = object()
+
+        buf.add(self.user.id, 'abc', 100, 5, (0, 5))
+        buf.add(self.user.id, 'abc', 100, 5, (0, 5))
+        buf.add(self.user.id, 'abc', 100, 5)
+        self.assertEquals(buf.spans,
+                          {(self.user.id, 'abc'): [(0, 5), (0, 5)]})
+        buf.flush()
+        self.assertEquals(buf.spans, {})
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='abc')
+        self.assertEquals(uvv.seconds_viewed, 15)
+        self.assertEquals(uvv.unique_seconds, 5)
+
+
+class RecordHeartbeatTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+
+    def test_durable(self):
+        record_heartbeat(self.user.id, 'abc', 100, 5)
+        self.assertEquals(
+            UserVideoView.objects.get(user=self.user).seconds_viewed, 5)
+
+        # the locking select & the update, in one transaction
+        with CaptureQueriesContext(connection) as ctx:
+            record_heartbeat(self.user.id, 'abc', 100, 5, (10, 15))
+        statements = [q['sql'] for q in ctx.captured_queries
+                      if 'SAVEPOINT' not in q['sql']]
+        self.assertEquals(len(statements), 2)
+
+        uvv = UserVideoView.objects.get(user=self.user)
+        self.assertEquals(uvv.seconds_viewed, 10)
+        self.assertEquals(uvv.watched_intervals(), [(10, 15)])
+        self.assertEquals(uvv.unique_seconds, 5)
+
+        # the first heartbeat for a video creates the row
+        record_heartbeat(self.user.id, 'def', 50, 5, (0, 5))
+        uvv = UserVideoView.objects.get(user=self.user, video_id='def')
+        self.assertEquals(uvv.video_duration, 50)
+        self.assertEquals(uvv.seconds_viewed, 5)
+        self.assertEquals(uvv.watched_intervals(), [(0, 5)])
+
+    def test_parse_span(self):
+        self.assertIsNone(parse_span({}, 5))
+        self.assertIsNone(parse_span({'start': 'x', 'end': 5}, 5))
+        self.assertEquals(parse_span({'start': 10.4, 'end': '14.6'}, 5),
+                          (10, 15))
+
+        # a seek forward during the interval
+        self.assertEquals(parse_span({'start': 10, 'end': 100}, 5),
+                          (95, 100))
+
+        self.assertIsNone(parse_span({'start': 'inf', 'end': 5}, 5))
+        self.assertIsNone(parse_span({'start': 0, 'end': 'nan'}, 5))
+
+    @override_settings(VIDEO_TRACKING_MODE='buffered')
+    def test_buffered(self):
+        flusher = heartbeat_buffer.flusher
+        heartbeat_buffer.flusher = object()
+        try:
+            record_heartbeat(self.user.id, 'abc', 100, 5)
+            self.assertFalse(UserVideoView.objects.exists())
+            heartbeat_buffer.flush()
+        finally:
+            heartbeat_buffer.flusher = flusher
+
+        self.assertEquals(
+            UserVideoView.objects.get(user=self.user).seconds_viewed, 5)
@@ -0,0 +1,66 @@
+from django.test import TestCase
+from pagetree.models import Hierarchy, UserPageVisit
+from pagetree.tests.factories import ModuleFactory, UserFactory
+
+from videoanalytics.main.unlocks import gate_check
+
+
+class UnlockStateTest(TestCase):
+
+    def setUp(self):
+        ModuleFactory('one', '/pages/one/')
+        self.hierarchy = Hierarchy.objects.get(name='one')
+        self.sections = list(self.hierarchy.get_root().get_descendants())
+        self.user = UserFactory()
+
+    def visit(self, section, status='complete'):
+        UserPageVisit.objects.update_or_create(
+            user=self.user, section=section, defaults={'status': status})
+
+    def assertMatchesSection(self):
+        for section in self.sections:
+            self.assertEquals(gate_check(self.user, section),
+                              section.gate_check(self.user))
+
+    def test_gate_check(self):
+        self.assertMatchesSection()
+
+        self.visit(self.sections[0])
+        self.visit(self.sections[1], status='incomplete')
+        self.visit(self.sections[2])
+        self.assertMatchesSection()
+
+        for section in self.sections[1:]:
+            self.visit(section)
+        self.assertMatchesSection()
+
+    def test_cached_for_user(self):
+        gate_check(self.user, self.sections[0])
+        with self.assertNumQueries(0):
+            for section in self.sections:
+                gate_check(self.user, section)
+
+        # the content version, then the visits
+        other = UserFactory()
+        with self.assertNumQueries(2):
+            gate_check(other, self.sections[0])
+
+    def test_section_added(self):
+        gate_check(self.user, self.sections[0])
+
+        # the state kept on the user predates the new section
+        section = self.hierarchy.get_root().append_child('New', 'new')
+        self.assertEquals(gate_check(self.user, section),
+                          section.gate_check(self.user))
+
+    def test_visit_unlocks(self):
+        self.assertEquals(gate_check(self.user, self.sections[1]),
+                          (False, self.sections[0]))
+
+        self.visit(self.sections[0])
+        self.assertEquals(gate_check(self.user, self.sections[1]),
+                          (True, None))
+
+        UserPageVisit.objects.filter(section=self.sections[0]).delete()
+        self.assertEquals(gate_check(self.user, self.sections[1]),
+                          (False, self.sections[0]))
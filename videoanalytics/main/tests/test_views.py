@@ -1,8 +1,27 @@
+import gzip
+import json
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import timedelta
+from io import BytesIO
+
+import numpy as np
+
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import TestCase
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
 from pagetree.helpers import get_hierarchy
 from pagetree.tests.factories import UserFactory
+from quizblock.models import Answer, Question, Quiz
+
+from videoanalytics.main import models
+from videoanalytics.main.jobs import claim_job, run_job
+from videoanalytics.main.models import QuizSummaryBlock, \
+    QuizSummaryReportColumn, ReportJob, UserVideoView, YouTubeBlock
 
 
 class BasicTest(TestCase):
@@ -88,6 +107,51 @@ class PagetreeViewTestsLoggedIn(TestCase):
         self.assertEqual(r.status_code, 200)
 
 
+class PageBlocksTest(TestCase):
+
+    def setUp(self):
+        hierarchy = get_hierarchy('videos', '/pages/videos/')
+        self.section = hierarchy.get_root().append_child('One', 'one')
+        self.user = UserFactory()
+        self.client.login(username=self.user.username, password="test")
+
+    def add_blocks(self, count):
+        start = YouTubeBlock.objects.count()
+        for i in range(start, start + count):
+            video = YouTubeBlock.objects.create(video_id='v%d' % i,
+                                                title='Video %d' % i)
+            self.section.append_pageblock('', '', content_object=video)
+
+            quiz = Quiz.objects.create(rhetorical=True)
+            question = Question.objects.create(
+                quiz=quiz, text='question', question_type='single choice')
+            for value in ('1', '2', '3'):
+                Answer.objects.create(question=question, value=value,
+                                      label='label %s' % value)
+            self.section.append_pageblock('', '', content_object=quiz)
+
+    def get_queries(self):
+        # the first visit is recorded and pagetree caches the urls
+        self.client.get('/pages/videos/one/')
+        self.client.get('/pages/videos/one/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/pages/videos/one/')
+        self.assertEquals(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_queries_constant(self):
+        self.add_blocks(1)
+        queries = self.get_queries()
+
+        # the participant's response is looked up per question
+        self.add_blocks(4)
+        self.assertEquals(self.get_queries(), queries + 4)
+
+        response = self.client.get('/pages/videos/one/')
+        self.assertContains(response, 'Video 4')
+        self.assertContains(response, 'label 3', count=5)
+
+
 class ChangePasswordTest(TestCase):
 
     def test_logged_out(self):
@@ -151,3 +215,529 @@ class ReportViewTest(TestCase):
         self.client.login(username=user.username, password="test")
         response = self.client.get(url)
         self.assertEquals(response.status_code, 200)
+
+    def test_delta(self):
+        staff = UserFactory(is_staff=True)
+        participant = UserFactory()
+        self.client.login(username=staff.username, password="test")
+
+        response = self.client.get('/report/', {'type': 'values'})
+        watermark = response['X-Report-Watermark']
+        self.assertEquals(len(b''.join(
+            response.streaming_content).splitlines()), 2)
+
+        response = self.client.get('/report/', {'type': 'values',
+                                                'since': watermark})
+        self.assertEquals(
+            response['Content-Disposition'],
+            'attachment; filename="videoanalytics_values_delta.csv"')
+        self.assertEquals(len(b''.join(
+            response.streaming_content).splitlines()), 1)
+
+        UserVideoView.record_view(participant.id, 'abc', 100, 5)
+        response = self.client.get('/report/', {'type': 'values',
+                                                'since': watermark})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals(len(rows), 2)
+        self.assertTrue(rows[1].startswith(participant.username))
+
+        # refused once the content changed since the snapshot
+        version = response['X-Report-Version']
+        response = self.client.get('/report/', {
+            'type': 'values', 'since': watermark, 'version': version})
+        self.assertEquals(response.status_code, 200)
+        get_hierarchy('main', '/pages/main/').get_root().append_child(
+            'New', 'new')
+        response = self.client.get('/report/', {
+            'type': 'values', 'since': watermark, 'version': version})
+        self.assertEquals(response.status_code, 400)
+
+    def test_npz(self):
+        staff = UserFactory(is_staff=True)
+        UserFactory()
+        self.client.login(username=staff.username, password="test")
+        response = self.client.get('/report/', {'type': 'values',
+                                                'format': 'npz'})
+        self.assertEquals(response['Content-Disposition'],
+                          'attachment; filename="videoanalytics_values.npz"')
+        archive = np.load(BytesIO(response.content))
+        self.assertEquals(len(archive['participant_id']), 1)
+
+        # full values reports only, as export_report writes them
+        response = self.client.get('/report/', {
+            'type': 'values', 'format': 'npz',
+            'since': timezone.now().isoformat()})
+        self.assertEquals(response.status_code, 400)
+        response = self.client.get('/report/', {'type': 'key',
+                                                'format': 'npz'})
+        self.assertEquals(response.status_code, 400)
+
+    def gunzip(self, response):
+        return gzip.GzipFile(fileobj=BytesIO(
+            b''.join(response.streaming_content))).read()
+
+    def test_compress(self):
+        staff = UserFactory(is_staff=True)
+        participant = UserFactory()
+        self.client.login(username=staff.username, password="test")
+
+        response = self.client.get('/report/', {'type': 'values'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        expected = b''.join(response.streaming_content)
+        self.assertTrue(participant.username.encode() in expected)
+
+        response = self.client.get('/report/', {'type': 'values',
+                                                'compress': 'gzip'})
+        self.assertEquals(response['Content-Type'], 'application/gzip')
+        self.assertEquals(
+            response['Content-Disposition'],
+            'attachment; filename="videoanalytics_values.csv.gz"')
+        self.assertEquals(
+            self.gunzip(response), expected)
+
+        response = self.client.get('/report/', {'type': 'values'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+        self.assertEquals(
+            self.gunzip(response), expected)
+
+        response = self.client.get('/report/', {'type': 'values',
+                                                'compress': 'none'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEquals(b''.join(response.streaming_content), expected)
+
+        response = self.client.get('/report/', {'compress': 'zip'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_key_after_reorder(self):
+        quiz = Quiz.objects.create()
+        hierarchy = get_hierarchy('a', '/pages/a/')
+        section = hierarchy.get_root().append_child('One', 'one')
+        section.append_pageblock('Quiz', '', content_object=quiz)
+        one = Question.objects.create(quiz=quiz, text='one',
+                                      question_type='short text')
+        two = Question.objects.create(quiz=quiz, text='two',
+                                      question_type='short text')
+
+        staff = UserFactory(is_staff=True)
+        self.client.login(username=staff.username, password="test")
+        response = self.client.get('/report/', {'compress': 'none'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(lines[-2].split(b',')[1],
+                          ('%d_%d' % (hierarchy.id, one.id)).encode())
+
+        # quizblock sets the order without saving the questions
+        response = self.client.post(
+            '/quizblock/reorder_questions/%d/?question_1=%d&question_2=%d' %
+            (quiz.id, two.id, one.id))
+        self.assertEquals(response.status_code, 200)
+
+        response = self.client.get('/report/', {'compress': 'none'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(lines[-2].split(b',')[1],
+                          ('%d_%d' % (hierarchy.id, two.id)).encode())
+
+    def test_projection(self):
+        quiz = Quiz.objects.create()
+        question = Question.objects.create(
+            quiz=quiz, text='question', question_type='single choice')
+        Answer.objects.create(question=question, label='one', value='1')
+        Answer.objects.create(question=question, label='two', value='2')
+
+        section = get_hierarchy('a', '/pages/a/').get_root().append_child(
+            'One', 'one')
+        section.append_pageblock('Quiz', '', content_object=quiz)
+        section.append_pageblock(
+            'Summary', '', content_object=QuizSummaryBlock.objects.create())
+        section = get_hierarchy('b', '/pages/b/').get_root().append_child(
+            'One', 'one')
+        block = YouTubeBlock.objects.create(video_id='abc', title='Title')
+        section.append_pageblock('Video', '', content_object=block)
+        UserFactory()
+
+        staff = UserFactory(is_staff=True)
+        self.client.login(username=staff.username, password="test")
+
+        def bulk_user_value(column, user, chunk):
+            raise AssertionError('quiz summary evaluated')
+
+        original = QuizSummaryReportColumn.bulk_user_value
+        QuizSummaryReportColumn.bulk_user_value = bulk_user_value
+        try:
+            response = self.client.get('/report/', {
+                'type': 'values', 'compress': 'none', 'columns': 'abc'})
+            lines = b''.join(response.streaming_content).splitlines()
+        finally:
+            QuizSummaryReportColumn.bulk_user_value = original
+        self.assertEquals(lines[0], b'participant_id,abc')
+        self.assertEquals(len(lines), 2)
+
+        response = self.client.get('/report/', {
+            'type': 'values', 'compress': 'none', 'hierarchy': 'b'})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertTrue(lines[0].endswith(b',last_access,abc'))
+
+        # the key rows of each of the question's answers
+        identifier = '%d_%d' % (quiz.pageblock().section.hierarchy.id,
+                                question.id)
+        response = self.client.get('/report/', {
+            'compress': 'none', 'columns': identifier})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEquals(len(lines), 5)
+        self.assertTrue(lines[2].startswith(b',participant_id,'))
+        self.assertTrue(lines[3].startswith(b'a,' + identifier.encode()))
+        self.assertTrue(lines[4].startswith(b'a,' + identifier.encode()))
+
+        for params in ({'columns': 'nope'}, {'hierarchy': 'nope'}):
+            response = self.client.get('/report/', params)
+            self.assertEquals(response.status_code, 400)
+
+    def test_invalid_since(self):
+        staff = UserFactory(is_staff=True)
+        self.client.login(username=staff.username, password="test")
+        response = self.client.get('/report/', {'type': 'values',
+                                                'since': 'yesterday'})
+        self.assertEquals(response.status_code, 400)
+
+
+class TrackVideoViewTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.login(username=self.user.username, password="test")
+
+    def post(self, data):
+        return self.client.post('/track/', data,
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_invalid(self):
+        response = self.post({'video_duration': 100, 'seconds_viewed': 5})
+        self.assertEquals(response.json()['msg'], 'Invalid video id')
+
+        response = self.post({'video_id': 'abc', 'seconds_viewed': 5})
+        self.assertEquals(response.json()['msg'], 'Invalid video duration')
+
+        response = self.post({'video_id': 'abc', 'video_duration': 10 ** 9,
+                              'seconds_viewed': 5})
+        self.assertEquals(response.json()['msg'], 'Invalid video duration')
+
+        response = self.post({'video_id': 'abc', 'video_duration': 100,
+                              'seconds_viewed': 10 ** 9})
+        self.assertEquals(response.json()['msg'], 'Invalid seconds viewed')
+
+        self.assertFalse(UserVideoView.objects.exists())
+
+    def test_track(self):
+        data = {'video_id': 'abc', 'video_duration': 100,
+                'seconds_viewed': 5}
+        self.assertTrue(self.post(data).json()['success'])
+        self.assertTrue(self.post(data).json()['success'])
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='abc')
+        self.assertEquals(uvv.video_duration, 100)
+        self.assertEquals(uvv.seconds_viewed, 10)
+
+    def test_track_positions(self):
+        data = {'video_id': 'abc', 'video_duration': 100,
+                'seconds_viewed': 5, 'start': '0.2', 'end': '5.1'}
+        self.assertTrue(self.post(data).json()['success'])
+        self.assertTrue(self.post(data).json()['success'])
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='abc')
+        self.assertEquals(uvv.seconds_viewed, 10)
+        self.assertEquals(uvv.unique_seconds, 5)
+
+
+class TrackVideoBatchViewTest(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.login(username=self.user.username, password="test")
+
+    def post(self, intervals):
+        return self.client.post('/track/batch/',
+                                {'intervals': json.dumps(intervals)})
+
+    def test_logged_out(self):
+        self.client.logout()
+        response = self.post([])
+        self.assertEquals(response.status_code, 302)
+
+    def test_invalid(self):
+        response = self.client.post('/track/batch/', {'intervals': '{'})
+        self.assertEquals(response.json()['msg'], 'Invalid intervals')
+
+        response = self.post({'video_id': 'abc'})
+        self.assertEquals(response.json()['msg'], 'Invalid intervals')
+
+        response = self.post([{'video_id': 'abc', 'video_duration': 'x'}])
+        self.assertEquals(response.json()['msg'], 'Invalid intervals')
+
+        # one bad interval rejects the batch
+        response = self.post([
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 5},
+            {'video_id': '', 'video_duration': 100, 'seconds_viewed': 5}])
+        self.assertEquals(response.json()['msg'], 'Invalid video id')
+
+        response = self.post([{'video_id': 'abc', 'seconds_viewed': 5}])
+        self.assertEquals(response.json()['msg'], 'Invalid video duration')
+
+        # json.loads reads 1e400 as infinity
+        response = self.client.post('/track/batch/', {
+            'intervals': '[{"video_id": "abc", "video_duration": 1e400}]'})
+        self.assertEquals(response.json()['msg'], 'Invalid intervals')
+
+        self.assertFalse(UserVideoView.objects.exists())
+
+    def test_batch(self):
+        UserVideoView.objects.create(user=self.user, video_id='abc',
+                                     video_duration=100, seconds_viewed=10)
+
+        # not an ajax request, as sent by navigator.sendBeacon
+        response = self.post([
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 5},
+            {'video_id': 'def', 'video_duration': 60, 'seconds_viewed': 5},
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 3}])
+        self.assertTrue(response.json()['success'])
+
+        self.assertEquals(UserVideoView.objects.get(
+            user=self.user, video_id='abc').seconds_viewed, 18)
+        self.assertEquals(UserVideoView.objects.get(
+            user=self.user, video_id='def').seconds_viewed, 5)
+
+        self.assertTrue(self.post([]).json()['success'])
+
+    def test_batch_positions(self):
+        response = self.post([
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 5,
+             'start': 0, 'end': 5},
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 5,
+             'start': 5, 'end': 10},
+            {'video_id': 'abc', 'video_duration': 100, 'seconds_viewed': 5,
+             'start': 0, 'end': 5}])
+        self.assertTrue(response.json()['success'])
+
+        uvv = UserVideoView.objects.get(user=self.user, video_id='abc')
+        self.assertEquals(uvv.seconds_viewed, 15)
+        self.assertEquals(uvv.unique_seconds, 10)
+        self.assertEquals(uvv.watched_intervals(), [(0, 10)])
+
+
+class ParticipantReportViewTest(TestCase):
+
+    def setUp(self):
+        hierarchy = get_hierarchy('a', '/pages/a/')
+        section = hierarchy.get_root().append_child('One', 'one')
+        block = YouTubeBlock.objects.create(video_id='abc', title='Title')
+        section.append_pageblock('Video', '', content_object=block)
+        get_hierarchy('b', '/pages/b/')
+
+        self.one = UserFactory()
+        self.two = UserFactory()
+        self.two.profile.research_group = 'b'
+        self.two.profile.save()
+        UserVideoView.objects.create(user=self.one, video_id='abc',
+                                     seconds_viewed=50, video_duration=200)
+
+        self.staff = UserFactory(is_staff=True)
+        self.url = reverse('report-participants-view')
+
+    def get_records(self, params):
+        self.client.login(username=self.staff.username, password="test")
+        response = self.client.get(self.url, params)
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join(response.streaming_content).decode()
+        # keeps the column order on Python 2 as well
+        return [json.loads(line, object_pairs_hook=OrderedDict)
+                for line in content.splitlines()]
+
+    def test_access_denied(self):
+        self.assertEquals(self.client.get(self.url).status_code, 302)
+
+        self.client.login(username=self.one.username, password="test")
+        self.assertEquals(self.client.get(self.url).status_code, 302)
+
+    def test_records(self):
+        records = self.get_records({})
+        self.assertEquals(len(records), 2)
+        self.assertEquals(list(records[0].keys()), [
+            'participant_id', 'research_group', 'percent_complete',
+            'first_access', 'last_access', 'abc'])
+        self.assertEquals(records[0]['participant_id'], self.one.username)
+        self.assertEquals(records[0]['abc'], 25.0)
+        self.assertEquals(records[1]['abc'], None)
+
+    def test_filters(self):
+        records = self.get_records({'research_group': 'b'})
+        self.assertEquals([r['participant_id'] for r in records],
+                          [self.two.username])
+
+        records = self.get_records({'min_user_id': self.two.id,
+                                    'max_user_id': self.two.id + 100})
+        self.assertEquals([r['participant_id'] for r in records],
+                          [self.two.username])
+
+        records = self.get_records({'hierarchy': 'b'})
+        self.assertFalse('abc' in records[0])
+
+    def test_fields(self):
+        # the video views are not loaded unless their column is selected
+        def load_video_views(user_ids):
+            raise AssertionError('video views loaded')
+
+        original = models.load_video_views
+        models.load_video_views = load_video_views
+        try:
+            records = self.get_records({'fields': 'percent_complete'})
+        finally:
+            models.load_video_views = original
+
+        self.assertEquals(records, [
+            {'participant_id': self.one.username, 'percent_complete': 0},
+            {'participant_id': self.two.username, 'percent_complete': 0}])
+
+    def test_invalid(self):
+        self.client.login(username=self.staff.username, password="test")
+        for params in ({'fields': 'percent_complete,nope'},
+                       {'hierarchy': 'nope'},
+                       {'min_user_id': 'one'}):
+            response = self.client.get(self.url, params)
+            self.assertEquals(response.status_code, 400)
+
+
+class RetentionViewTest(TestCase):
+
+    def setUp(self):
+        block = YouTubeBlock.objects.create(video_id='abc', title='Title')
+        YouTubeBlock.objects.create(video_id='def', title='Other')
+        # the same video on another page
+        YouTubeBlock.objects.create(video_id='abc', title='Again')
+
+        participant = UserFactory()
+        uvv = UserVideoView(user=participant, video_id=block.video_id,
+                            video_duration=4)
+        uvv.mark_watched([(0, 2)])
+        uvv.save()
+
+        self.staff = UserFactory(is_staff=True)
+        uvv = UserVideoView(user=self.staff, video_id=block.video_id,
+                            video_duration=4)
+        uvv.mark_watched([(0, 4)])
+        uvv.save()
+
+    def test_access_denied(self):
+        url = reverse('retention-view')
+        self.assertEquals(self.client.get(url).status_code, 302)
+
+        user = UserFactory()
+        self.client.login(username=user.username, password="test")
+        self.assertEquals(self.client.get(url).status_code, 302)
+
+    def test_html(self):
+        self.client.login(username=self.staff.username, password="test")
+        response = self.client.get(reverse('retention-view'))
+        self.assertEquals(response.status_code, 200)
+        self.assertContains(response, 'Title (abc)')
+        self.assertContains(response, 'No viewers yet')
+
+    def test_csv(self):
+        self.client.login(username=self.staff.username, password="test")
+        response = self.client.get(reverse('retention-view'),
+                                   {'format': 'csv'})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals(rows[0], 'video_id,title,research_group,viewers,'
+                          'duration,p25,p50,p75,p90')
+        self.assertEquals(rows[1], 'abc,Title,all,1,4,0.5,0.5,0.5,0.5')
+        self.assertEquals(rows[2], 'abc,Title,a,1,4,0.5,0.5,0.5,0.5')
+        self.assertEquals(len(rows), 3)
+
+        response = self.client.get(reverse('retention-view'),
+                                   {'format': 'csv', 'type': 'curve'})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals(rows[0], 'video_id,research_group,second,'
+                          'share_watching')
+        self.assertEquals(rows[1:5], ['abc,all,0,1.0', 'abc,all,1,1.0',
+                                      'abc,all,2,0.0', 'abc,all,3,0.0'])
+        self.assertEquals(len(rows), 9)
+
+
+class ReportJobViewTest(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(REPORT_JOB_ROOT=self.media_root)
+        self.settings.enable()
+
+        self.staff = UserFactory(is_staff=True)
+        self.participant = UserFactory()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_access_denied(self):
+        url = reverse('report-jobs-view')
+        self.assertEquals(self.client.get(url).status_code, 302)
+
+        self.client.login(username=self.participant.username,
+                          password="test")
+        self.assertEquals(self.client.post(url, {'type': 'key'}).status_code,
+                          302)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_export(self):
+        self.client.login(username=self.staff.username, password="test")
+        response = self.client.get(reverse('report-jobs-view'))
+        self.assertContains(response, 'No exports yet')
+
+        response = self.client.post(reverse('report-jobs-view'),
+                                    {'type': 'values'})
+        job = ReportJob.objects.get()
+        self.assertEquals(job.requested_by, self.staff)
+        self.assertRedirects(response,
+                             reverse('report-job-view', args=[job.id]))
+
+        # the queued job is reused
+        self.client.post(reverse('report-jobs-view'), {'type': 'values'})
+        self.assertEquals(ReportJob.objects.count(), 1)
+
+        url = reverse('report-job-view', args=[job.id])
+        self.assertContains(self.client.get(url), 'http-equiv="refresh"')
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEquals(json.loads(response.content.decode('utf-8'))[
+            'status'], 'queued')
+
+        download = reverse('report-job-download', args=[job.id])
+        self.assertEquals(self.client.get(download).status_code, 404)
+
+        run_job(claim_job())
+        self.assertNotContains(self.client.get(url), 'http-equiv="refresh"')
+
+        response = self.client.get(download)
+        self.assertEquals(response['Content-Disposition'],
+                          'attachment; filename="videoanalytics_values.csv"')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals(len(rows), 2)
+
+    def test_invalid_type(self):
+        self.client.login(username=self.staff.username, password="test")
+        response = self.client.post(reverse('report-jobs-view'),
+                                    {'type': 'other'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_stale_job(self):
+        self.client.login(username=self.staff.username, password="test")
+        self.client.post(reverse('report-jobs-view'), {'type': 'key'})
+        job = claim_job()
+
+        # the worker was killed mid-build
+        ReportJob.objects.filter(id=job.id).update(
+            started=timezone.now() - timedelta(days=1))
+        self.client.post(reverse('report-jobs-view'), {'type': 'key'})
+
+        self.assertEquals(ReportJob.objects.get(id=job.id).status,
+                          ReportJob.FAILED)
+        self.assertEquals(ReportJob.objects.filter(
+            status=ReportJob.QUEUED).count(), 1)
@@ -0,0 +1,261 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction, IntegrityError
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from videoanalytics.main.models import UserVideoView
+
+
+# VIDEO_TRACKING_MODE
+#   'durable' - each heartbeat is written as it arrives (default)
+#   'buffered' - heartbeats are summed in-process and written in bulk every
+#     VIDEO_TRACKING_FLUSH_SECONDS or VIDEO_TRACKING_FLUSH_EVENTS heartbeats.
+#     Higher throughput, but seconds still buffered are lost if the worker
+#     is killed without a clean shutdown.
+DURABLE = 'durable'
+BUFFERED = 'buffered'
+
+# the longest video a heartbeat may report, and the most seconds viewed in
+# one interval. The coverage bitset is sized by the video duration.
+MAX_VIDEO_DURATION = 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def tracking_mode():
+    return getattr(settings, 'VIDEO_TRACKING_MODE', DURABLE)
+
+
+class HeartbeatBuffer(object):
+    '''Coalesces heartbeats per (user id, video id) and writes the combined
+    deltas with one UPDATE for existing rows and one INSERT for new ones.
+    The watched positions are kept as a list of spans per key.
+    '''
+
+    def __init__(self, flush_seconds, flush_events):
+        self.flush_seconds = flush_seconds
+        self.flush_events = flush_events
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.spans = {}
+        self.events = 0
+        self.flusher = None
+
+    def add(self, user_id, video_id, video_duration, seconds_viewed,
+            span=None):
+        with self.lock:
+            key = (user_id, video_id)
+            seconds = self.pending.get(key, (0, 0))[1]
+            self.pending[key] = (video_duration, seconds + seconds_viewed)
+            if span is not None:
+                self.spans.setdefault(key, []).append(span)
+            self.events += 1
+            full = self.events >= self.flush_events
+
+        if full:
+            self.safe_flush()
+        else:
+            self.start()
+
+    def start(self):
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.run)
+                self.flusher.daemon = True
+                self.flusher.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            # the thread outlives any request, drop a connection the
+            # database has closed or that is past CONN_MAX_AGE
+            close_old_connections()
+            self.safe_flush()
+
+    def safe_flush(self):
+        '''flush, logging a failure: the seconds stay buffered for the
+        next flush, so the heartbeat itself has still been recorded'''
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('heartbeat flush failed')
+
+    def take(self):
+        with self.lock:
+            pending, spans = self.pending, self.spans
+            self.pending, self.spans = {}, {}
+            self.events = 0
+        return pending, spans
+
+    def restore(self, pending, spans):
+        with self.lock:
+            for key, (video_duration, seconds) in pending.items():
+                buffered = self.pending.get(key, (video_duration, 0))
+                self.pending[key] = (buffered[0], buffered[1] + seconds)
+            for key, watched in spans.items():
+                self.spans[key] = watched + self.spans.get(key, [])
+
+    def flush(self):
+        pending, spans = self.take()
+        if len(pending) > 0:
+            try:
+                write_deltas(pending, spans)
+            except Exception:
+                # keep the seconds for the next flush
+                self.restore(pending, spans)
+                raise
+
+
+def write_deltas(deltas, spans=None):
+    '''deltas maps (user id, video id) to (video duration, seconds), spans
+    maps the same keys to lists of watched (start, end) positions'''
+    keys = Q()
+    for user_id, video_id in deltas.keys():
+        keys |= Q(user_id=user_id, video_id=video_id)
+
+    with transaction.atomic():
+        existing = set(UserVideoView.objects.filter(keys).values_list(
+            'user_id', 'video_id'))
+        if len(existing) > 0:
+            increment(dict((k, deltas[k]) for k in existing))
+
+        create(dict((k, deltas[k]) for k in deltas if k not in existing))
+
+        if spans:
+            write_spans(spans)
+
+
+def create(deltas):
+    try:
+        with transaction.atomic():
+            UserVideoView.objects.bulk_create([
+                UserVideoView(user_id=k[0], video_id=k[1],
+                              video_duration=deltas[k][0],
+                              seconds_viewed=deltas[k][1])
+                for k in deltas.keys()])
+    except IntegrityError:
+        # another worker created some of these rows first
+        for k in deltas.keys():
+            UserVideoView.record_view(k[0], k[1], *deltas[k])
+
+
+def write_spans(spans):
+    keys = Q()
+    for user_id, video_id in spans.keys():
+        keys |= Q(user_id=user_id, video_id=video_id)
+
+    with transaction.atomic():
+        views = UserVideoView.objects.select_for_update().filter(keys)
+        for view in views:
+            view.mark_watched(spans[(view.user_id, view.video_id)])
+            view.save(update_fields=['coverage', 'unique_seconds',
+                                     'modified'])
+
+
+def increment(deltas):
+    duration = []
+    seconds = []
+    keys = Q()
+    for (user_id, video_id), (video_duration, delta) in deltas.items():
+        match = Q(user_id=user_id, video_id=video_id)
+        keys |= match
+        duration.append(When(match, then=video_duration))
+        seconds.append(When(match, then=F('seconds_viewed') + delta))
+
+    UserVideoView.objects.filter(keys).update(
+        video_duration=Case(*duration, default=F('video_duration')),
+        seconds_viewed=Case(*seconds, default=F('seconds_viewed')),
+        modified=timezone.now())
+
+
+heartbeat_buffer = HeartbeatBuffer(
+    getattr(settings, 'VIDEO_TRACKING_FLUSH_SECONDS', 10),
+    getattr(settings, 'VIDEO_TRACKING_FLUSH_EVENTS', 500))
+
+atexit.register(heartbeat_buffer.flush)
+
+
+def record_heartbeat(user_id, video_id, video_duration, seconds_viewed,
+                     span=None):
+    if tracking_mode() == BUFFERED:
+        heartbeat_buffer.add(user_id, video_id, video_duration,
+                             seconds_viewed, span)
+        return
+
+    if span is None:
+        UserVideoView.record_view(user_id, video_id, video_duration,
+                                  seconds_viewed)
+    else:
+        UserVideoView.record_span(user_id, video_id, video_duration,
+                                  seconds_viewed, span)
+
+
+def parse_span(data, seconds_viewed):
+    '''The (start, end) player positions of an interval, or None if the
+    client did not send them. A forward seek during the interval is
+    clamped to the seconds actually viewed.'''
+    try:
+        start = int(round(float(data.get('start'))))
+        end = int(round(float(data.get('end'))))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+    return (max(start, end - seconds_viewed), end)
+
+
+def check_interval(vid, video_duration, seconds_viewed):
+    '''raises ValueError with the message reported to the client'''
+    if vid == '':
+        raise ValueError('Invalid video id')
+    elif not 0 < video_duration <= MAX_VIDEO_DURATION:
+        raise ValueError('Invalid video duration')
+    elif not 0 <= seconds_viewed <= MAX_VIDEO_DURATION:
+        raise ValueError('Invalid seconds viewed')
+
+
+def parse_interval(interval):
+    try:
+        vid = interval.get('video_id', '')
+        video_duration = int(interval.get('video_duration', 0))
+        seconds_viewed = int(interval.get('seconds_viewed', 0))
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        raise ValueError('Invalid intervals')
+
+    check_interval(vid, video_duration, seconds_viewed)
+    span = parse_span(interval, seconds_viewed)
+    return vid, video_duration, seconds_viewed, span
+
+
+def coalesce_intervals(intervals):
+    '''Sum a batch of viewing intervals per video. Returns dicts mapping
+    video id to (video duration, seconds) and to the list of watched
+    spans, or raises ValueError with the message reported to the client.'''
+    if not isinstance(intervals, list):
+        raise ValueError('Invalid intervals')
+
+    deltas = {}
+    spans = {}
+    for interval in intervals:
+        vid, video_duration, seconds_viewed, span = parse_interval(interval)
+        seconds = deltas.get(vid, (0, 0))[1]
+        deltas[vid] = (video_duration, seconds + seconds_viewed)
+        if span is not None:
+            spans.setdefault(vid, []).append(span)
+    return deltas, spans
+
+
+def record_intervals(user_id, intervals):
+    deltas, spans = coalesce_intervals(intervals)
+
+    if tracking_mode() == BUFFERED:
+        for interval in intervals:
+            heartbeat_buffer.add(user_id, *parse_interval(interval))
+    elif len(deltas) > 0:
+        write_deltas(
+            dict(((user_id, vid), delta) for vid, delta in deltas.items()),
+            dict(((user_id, vid), span) for vid, span in spans.items()))
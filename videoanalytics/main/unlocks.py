@@ -0,0 +1,68 @@
+'''Which sections of a gated hierarchy a participant may open.
+
+pagetree's Section.gate_check walks the hierarchy and loads each of the
+user's page visits, with its section, on every call. A gated page checks
+its own section, the {% ifaccessible %} tag the next one, and IndexView
+the last leaf. UnlockState answers those checks from the hierarchy's
+cached page order (see main.structure) and one query for the user's
+complete visits to the hierarchy.
+
+The states are kept on the user object, like Django's permission cache,
+so they last for the request. Recording or removing a page visit, which
+is also how a submission unlocks the next page, moves a process-wide
+stamp, and the states are rebuilt on their next read.'''
+
+from pagetree.models import UserPageVisit
+
+from videoanalytics.main.structure import hierarchy_metadata
+
+
+_visit_stamp = 0
+
+
+class UnlockState(object):
+    def __init__(self, user, hierarchy):
+        self.user = user
+        metadata = hierarchy_metadata(hierarchy.name)
+        self.positions = metadata.positions
+
+        visited = set(UserPageVisit.objects.filter(
+            user=user, section__hierarchy=hierarchy,
+            status='complete').values_list('section_id', flat=True))
+        self.first_locked = next(
+            (s for s in metadata.sections if s.id not in visited), None)
+
+    def gate_check(self, section):
+        '''Section.gate_check: whether every page before section has been
+        visited, and if not, the first page still to visit'''
+        if section.id not in self.positions:
+            # added since the state was built, or the root
+            return section.gate_check(self.user)
+        if (self.first_locked is None or
+                self.positions[section.id] <=
+                self.positions[self.first_locked.id]):
+            return True, None
+        return False, self.first_locked
+
+
+def unlock_state(user, hierarchy):
+    states = getattr(user, '_unlock_states', None)
+    if states is None or states[0] != _visit_stamp:
+        states = (_visit_stamp, {})
+        user._unlock_states = states
+    if hierarchy.id not in states[1]:
+        states[1][hierarchy.id] = UnlockState(user, hierarchy)
+    return states[1][hierarchy.id]
+
+
+def gate_check(user, section):
+    '''section.gate_check(user) from the user's UnlockState'''
+    if not user:
+        return False, section
+    return unlock_state(user, section.hierarchy).gate_check(section)
+
+
+def visit_recorded(*args, **kwargs):
+    '''signal handler for UserPageVisit saves and deletes'''
+    global _visit_stamp
+    _visit_stamp += 1
@@ -1,18 +1,47 @@
 import csv
+import json
+from collections import OrderedDict
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.http.response import HttpResponseRedirect, StreamingHttpResponse
-from django.views.generic.base import View
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.db.models import prefetch_related_objects
+from django.http.response import FileResponse, HttpResponse, \
+    HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import smart_bytes
+from django.utils.text import compress_sequence
+from django.views.generic.base import View, TemplateView
+from django.views.generic.detail import DetailView
+from pagetree.compat import user_is_anonymous
 from pagetree.generic.views import EditView, PageView
-from pagetree.models import Hierarchy
 from pagetree.models import PageBlock
 from quizblock.models import Quiz, Submission
-
-from videoanalytics.main.mixins import JSONResponseMixin, LoggedInMixin, \
-    LoggedInSuperuserMixin, LoggedInStaffMixin
-from videoanalytics.main.models import VideoAnalyticsReport, UserVideoView
+from quizblock.views import ReorderAnswersView as BaseReorderAnswersView, \
+    ReorderQuestionsView as BaseReorderQuestionsView
+
+from videoanalytics.main.columnar import write_npz
+from videoanalytics.main.export import check_content_version, \
+    parse_watermark
+from videoanalytics.main.jobs import fail_stale_jobs
+from videoanalytics.main.mixins import JSONRenderMixin, JSONResponseMixin, \
+    LoggedInMixin, LoggedInSuperuserMixin, LoggedInStaffMixin
+from videoanalytics.main.models import ReportJob, VideoAnalyticsReport, \
+    YouTubeBlock, all_quiz_topic_scores_stale, prefetch_blocks
+from videoanalytics.main.retention import QUANTILES, video_retention
+from videoanalytics.main.structure import all_hierarchies, \
+    clear_hierarchy_metadata, structure_version
+from videoanalytics.main.tracking import check_interval, parse_span, \
+    record_heartbeat, record_intervals
+from videoanalytics.main.templatetags.quizsummary import QuizCompletion
+from videoanalytics.main.unlocks import gate_check
 
 
 def context_processor(request):
@@ -33,7 +62,47 @@ class RestrictedEditView(LoggedInSuperuserMixin, EditView):
     template_name = "pagetree/edit_page.html"
 
 
-class RestrictedPageView(PageView):
+class SectionBlocksMixin(object):
+    """Loads the section's pageblocks and their blocks once per page.
+    pagetree's needs_submit, allow_redo and submitted checks and each
+    loop in pagetree/page.html then share them through the prefetched
+    section.pageblock_set, handed to the template as pageblocks.
+    quiz_completion answers {% ifquizcomplete %} for all the page's
+    quizzes at once."""
+
+    def get(self, request, path):
+        prefetch_related_objects([self.section], 'pageblock_set')
+        prefetch_blocks(self.section.pageblock_set.all())
+        return super(SectionBlocksMixin, self).get(request, path)
+
+    def get_extra_context(self):
+        ctx = dict(super(SectionBlocksMixin, self).get_extra_context())
+        ctx['pageblocks'] = self.section.pageblock_set.all()
+        ctx['quiz_completion'] = QuizCompletion(
+            [pb.content_object for pb in ctx['pageblocks']
+             if isinstance(pb.content_object, Quiz)], self.request.user)
+        return ctx
+
+
+class UnlockStateMixin(object):
+    """Gates the page on the participant's UnlockState. Recording the
+    visit to the page then moves the visit stamp, so the {% ifaccessible %}
+    check of the next section builds a new state, which counts the
+    visit."""
+
+    def gate_check(self, user):
+        if not self.get_gated():
+            return None
+
+        if (not user) or user_is_anonymous(user):
+            raise PermissionDenied()
+
+        allow, first = gate_check(user, self.section)
+        if not allow:
+            return HttpResponseRedirect(first.get_absolute_url())
+
+
+class RestrictedPageView(UnlockStateMixin, SectionBlocksMixin, PageView):
 
     def perform_checks(self, request, path):
         user = self.request.user
@@ -46,7 +115,7 @@ class RestrictedPageView(PageView):
         return super(RestrictedPageView, self).perform_checks(request, path)
 
 
-class VideoPageView(PageView):
+class VideoPageView(UnlockStateMixin, SectionBlocksMixin, PageView):
 
     def perform_checks(self, request, path):
         user = self.request.user
@@ -75,18 +144,42 @@ class TrackVideoView(LoggedInMixin, JSONResponseMixin, View):
         video_duration = int(request.POST.get('video_duration', 0))
         seconds_viewed = int(request.POST.get('seconds_viewed', 0))
 
-        if vid == '':
-            context = {'success': False, 'msg': 'Invalid video id'}
-        elif video_duration < 1:
-            context = {'success': False, 'msg': 'Invalid video duration'}
+        try:
+            check_interval(vid, video_duration, seconds_viewed)
+        except ValueError as e:
+            context = {'success': False, 'msg': str(e)}
         else:
-            uvv = UserVideoView.objects.get_or_create(user=request.user,
-                                                      video_id=vid)
-            uvv[0].video_duration = video_duration
-            uvv[0].seconds_viewed += seconds_viewed
-            uvv[0].save()
+            span = parse_span(request.POST, seconds_viewed)
+            record_heartbeat(request.user.id, vid,
+                             video_duration, seconds_viewed, span)
+
+            context = {'success': True}
+
+        return self.render_to_json_response(context)
+
+
+class TrackVideoBatchView(LoggedInMixin, JSONRenderMixin, View):
+    """Records a batch of viewing intervals in one request.
+
+    The intervals are posted as a JSON array in the 'intervals' form
+    field, each with the video_id, video_duration, seconds_viewed and
+    optional start & end fields accepted by TrackVideoView. The batch
+    is applied in a single transaction. This view does not require an
+    ajax request so participant.js can deliver the final intervals with
+    navigator.sendBeacon when the page is closed.
+    """
+
+    def post(self, request):
+        try:
+            intervals = json.loads(request.POST.get('intervals', ''))
+        except ValueError:
+            intervals = None
 
+        try:
+            record_intervals(request.user.id, intervals)
             context = {'success': True}
+        except ValueError as e:
+            context = {'success': False, 'msg': str(e)}
 
         return self.render_to_json_response(context)
 
@@ -100,23 +193,307 @@ class Echo(object):
         return value
 
 
+def csv_response(request, rows, filename, compress=''):
+    """Stream the rows as a csv download. The rows are gzipped as they
+    are written when compress is 'gzip', downloading filename.gz, or when
+    compress is unset and the client accepts a gzip Content-Encoding.
+    """
+    writer = csv.writer(Echo())
+    content = (writer.writerow(row) for row in rows)
+
+    accepts_gzip = re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if compress == 'gzip':
+        response = StreamingHttpResponse(
+            compress_sequence(smart_bytes(line) for line in content),
+            content_type='application/gzip')
+        filename += '.gz'
+    elif compress == '' and accepts_gzip:
+        response = StreamingHttpResponse(
+            compress_sequence(smart_bytes(line) for line in content),
+            content_type='text/csv')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(content, content_type='text/csv')
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Content-Disposition'] = \
+        'attachment; filename="' + filename + '"'
+    return response
+
+
+def selected_hierarchies(names):
+    """The named hierarchies, or all of them when names is empty.
+    Raises ValueError for an unknown name."""
+    hierarchies = all_hierarchies()
+    if len(names) == 0:
+        return hierarchies
+
+    unknown = sorted(set(names) - set(h.name for h in hierarchies))
+    if len(unknown) > 0:
+        raise ValueError('Unknown hierarchy: %s' % ', '.join(unknown))
+    return [h for h in hierarchies if h.name in names]
+
+
+def selected_report(request, columns_param):
+    """(report, hierarchies) narrowed to the ?hierarchy= names and the
+    comma separated column identifiers in columns_param. participant_id
+    is always included. Raises ValueError for an unknown hierarchy or
+    column."""
+    hierarchies = selected_hierarchies(request.GET.getlist('hierarchy'))
+
+    identifiers = None
+    if request.GET.get(columns_param, ''):
+        identifiers = (['participant_id'] +
+                       request.GET[columns_param].split(','))
+
+    report = VideoAnalyticsReport(identifiers)
+    report.value_columns(hierarchies)  # checks the identifiers
+    return report, hierarchies
+
+
 class ReportView(LoggedInStaffMixin, View):
+    """?type=values&since=<ISO 8601 timestamp> limits the values to
+    users active after the timestamp. X-Report-Watermark is the since
+    to request next time, X-Report-Version the course content version.
+    Pass that as &version=<version> to have the delta refused once the
+    content has changed, as it can't then be merged into the snapshot.
+
+    ?type=values&format=npz downloads the values as typed NumPy arrays,
+    see videoanalytics.main.columnar. It is a full report, written
+    compressed whatever ?compress says.
+
+    ?compress=gzip downloads a .csv.gz, ?compress=none turns off the
+    gzip Content-Encoding otherwise used when the client accepts it.
+
+    ?hierarchy=<name> limits the pageblock columns to the hierarchy, and
+    may be repeated. ?columns=<identifier>,... limits the report to those
+    values columns, participant_id is always included. Any other column
+    is never evaluated.
+    """
 
-    def get(self, request):
-        report = VideoAnalyticsReport()
-        hierarchies = Hierarchy.objects.all()
+    def npz_response(self, report, hierarchies):
+        buf = BytesIO()
+        write_npz(buf, report, hierarchies)
+        response = HttpResponse(buf.getvalue(),
+                                content_type='application/octet-stream')
+        response['Content-Disposition'] = \
+            'attachment; filename="videoanalytics_values.npz"'
+        return response
 
+    def report_rows(self, request, report, hierarchies):
+        """(report type, rows). Raises ValueError for an invalid since."""
         report_type = request.GET.get('type', 'key')
-        if report_type == 'values':
-            rows = report.values(hierarchies)
+        if report_type == 'values' and 'since' in request.GET:
+            since = parse_watermark(request.GET['since'])
+            if 'version' in request.GET:
+                check_content_version(request.GET['version'])
+            return 'values_delta', report.delta_values(hierarchies, since)
+        elif report_type == 'values':
+            return report_type, report.values(hierarchies)
         else:
-            rows = report.metadata(hierarchies)
+            return report_type, report.metadata(hierarchies)
 
-        pseudo_buffer = Echo()
-        writer = csv.writer(pseudo_buffer)
+    def check_format(self, request):
+        if request.GET.get('compress', '') not in ('', 'gzip', 'none'):
+            raise ValueError('Unsupported compression')
+        if request.GET.get('format') == 'npz' and (
+                request.GET.get('type') != 'values' or
+                'since' in request.GET):
+            raise ValueError('npz is written for full values reports')
+
+    def get(self, request):
+        watermark = timezone.now()
+        version = structure_version()
+        compress = request.GET.get('compress', '')
+
+        try:
+            self.check_format(request)
+            report, hierarchies = selected_report(request, 'columns')
+            report_type, rows = self.report_rows(request, report, hierarchies)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        if request.GET.get('format') == 'npz':
+            return self.npz_response(report, hierarchies)
 
         fnm = "videoanalytics_%s.csv" % report_type
+        response = csv_response(request, rows, fnm, compress)
+        response['X-Report-Watermark'] = watermark.isoformat()
+        response['X-Report-Version'] = version
+        return response
+
+
+class ParticipantReportView(LoggedInStaffMixin, View):
+    """The VideoAnalyticsReport values as NDJSON, one object per
+    participant keyed by column identifier.
+
+    ?fields=<identifier>,... computes just those columns. participant_id
+    is always included.
+    ?hierarchy=<name> limits the pageblock columns to the hierarchy.
+    ?research_group=<name> limits the participants to the group.
+    Both may be repeated.
+    ?min_user_id=<id>&max_user_id=<id> limits the participants to an
+    inclusive user id range.
+    """
+
+    def get_users(self, request, report):
+        users = report.users()
+
+        groups = request.GET.getlist('research_group')
+        if len(groups) > 0:
+            users = users.filter(profile__research_group__in=groups)
+
+        try:
+            if 'min_user_id' in request.GET:
+                users = users.filter(id__gte=int(request.GET['min_user_id']))
+            if 'max_user_id' in request.GET:
+                users = users.filter(id__lte=int(request.GET['max_user_id']))
+        except ValueError:
+            raise ValueError('Invalid user id')
+        return users
+
+    def records(self, report, columns, users):
+        identifiers = report.value_headers(columns)
+        for row in report.user_rows(columns, users, typed=True):
+            yield json.dumps(OrderedDict(zip(identifiers, row)),
+                             cls=DjangoJSONEncoder) + '\n'
+
+    def get(self, request):
+        try:
+            report, hierarchies = selected_report(request, 'fields')
+            users = self.get_users(request, report)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        columns = report.value_columns(hierarchies)
+
+        return StreamingHttpResponse(self.records(report, columns, users),
+                                     content_type='application/x-ndjson')
+
+
+class ReorderQuestionsView(BaseReorderQuestionsView):
+    """quizblock's view sets the order without saving a question, so
+    the cached report columns are cleared and the stored quiz topic
+    scores, ordered by question, marked stale here"""
+
+    def update_order(self, parent, items):
+        super(ReorderQuestionsView, self).update_order(parent, items)
+        clear_hierarchy_metadata()
+        all_quiz_topic_scores_stale()
+
+
+class ReorderAnswersView(BaseReorderAnswersView):
+    def update_order(self, parent, items):
+        super(ReorderAnswersView, self).update_order(parent, items)
+        clear_hierarchy_metadata()
+
+
+class RetentionView(LoggedInStaffMixin, TemplateView):
+    """Audience retention per video, split by research group.
+
+    ?format=csv downloads the summary, ?format=csv&type=curve downloads
+    the share of viewers watching each second.
+    """
+    template_name = 'main/retention.html'
+
+    def get_videos(self):
+        # a video embedded on several pages is listed once, under the
+        # title of its first block
+        videos = OrderedDict()
+        for video_id, title in YouTubeBlock.objects.order_by(
+                'video_id', 'id').values_list('video_id', 'title'):
+            videos.setdefault(video_id, title)
+        return [(video_id, title, video_retention(video_id))
+                for video_id, title in videos.items()]
+
+    def summary_rows(self, videos):
+        yield (['video_id', 'title', 'research_group', 'viewers',
+                'duration'] + ['p%d' % q for q in QUANTILES])
+        for video_id, title, curves in videos:
+            for c in curves:
+                yield ([video_id, title, c.research_group, c.viewers,
+                        c.duration] + c.quantile_values())
+
+    def curve_rows(self, videos):
+        yield ['video_id', 'research_group', 'second', 'share_watching']
+        for video_id, title, curves in videos:
+            for c in curves:
+                for second, share in enumerate(c.curve):
+                    yield [video_id, c.research_group, second, share]
+
+    def get(self, request):
+        videos = self.get_videos()
+        if request.GET.get('format', '') != 'csv':
+            return self.render_to_response({'videos': videos,
+                                            'quantiles': QUANTILES})
+
+        report_type = request.GET.get('type', 'summary')
+        if report_type == 'curve':
+            rows = self.curve_rows(videos)
+        else:
+            report_type = 'summary'
+            rows = self.summary_rows(videos)
+
+        writer = csv.writer(Echo())
+        fnm = "videoanalytics_retention_%s.csv" % report_type
         response = StreamingHttpResponse(
             (writer.writerow(row) for row in rows), content_type="text/csv")
         response['Content-Disposition'] = 'attachment; filename="' + fnm + '"'
         return response
+
+
+class ReportJobView(LoggedInStaffMixin, TemplateView):
+    """Recent report exports. POST queues a new one for the
+    run_report_jobs worker, unless the same report is already waiting or
+    running on a live worker.
+    """
+    template_name = 'main/report_jobs.html'
+
+    def get_context_data(self, **kwargs):
+        ctx = super(ReportJobView, self).get_context_data(**kwargs)
+        ctx['jobs'] = ReportJob.objects.select_related('requested_by')[:20]
+        ctx['report_types'] = ReportJob.REPORT_TYPES
+        return ctx
+
+    def post(self, request):
+        report_type = request.POST.get('type', 'key')
+        if report_type not in dict(ReportJob.REPORT_TYPES):
+            return HttpResponseBadRequest('Invalid report type')
+
+        fail_stale_jobs()
+        job = ReportJob.objects.filter(
+            report_type=report_type,
+            status__in=[ReportJob.QUEUED, ReportJob.RUNNING]).first()
+        if job is None:
+            job = ReportJob.objects.create(report_type=report_type,
+                                           requested_by=request.user)
+        return HttpResponseRedirect(
+            reverse('report-job-view', args=[job.id]))
+
+
+class ReportJobDetailView(LoggedInStaffMixin, JSONRenderMixin, DetailView):
+    """A report export's progress. The page reloads itself until the
+    job finishes, ?format=json returns the progress for scripts.
+    """
+    model = ReportJob
+    template_name = 'main/report_job.html'
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('format', '') != 'json':
+            return super(ReportJobDetailView, self).get(
+                request, *args, **kwargs)
+        return self.render_to_json_response(self.get_object().as_dict())
+
+
+class ReportJobDownloadView(LoggedInStaffMixin, View):
+    """The finished export, served through a staff-only view since the
+    reports hold participant data"""
+
+    def get(self, request, pk):
+        job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.COMPLETE)
+        artifact = job.artifact.storage.open(job.artifact.name, 'rb')
+        response = FileResponse(artifact, content_type='text/csv')
+        response['Content-Disposition'] = \
+            'attachment; filename="' + job.filename() + '"'
+        return response
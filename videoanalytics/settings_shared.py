@@ -2,6 +2,7 @@
 # Django settings for videoanalytics project.
 import os.path
 from ccnmtlsettings.shared import common
+from videoanalytics.main.structure import clear_hierarchy_metadata
 
 project = 'videoanalytics'
 base = os.path.dirname(__file__)
@@ -41,3 +42,16 @@ PAGEBLOCKS = [
     'main.YouTubeBlock']
 
 MEDIA_ROOT = 'uploads'
+
+# report exports hold participant data, never put them under MEDIA_ROOT
+REPORT_JOB_ROOT = os.path.join(base, '..', 'reports')
+
+# 'durable' writes every /track/ heartbeat immediately. 'buffered' trades
+# durability for throughput, summing heartbeats in each worker and writing
+# them every VIDEO_TRACKING_FLUSH_SECONDS or VIDEO_TRACKING_FLUSH_EVENTS.
+VIDEO_TRACKING_MODE = 'durable'
+VIDEO_TRACKING_FLUSH_SECONDS = 10
+VIDEO_TRACKING_FLUSH_EVENTS = 500
+
+# drop the cached hierarchy structure whenever a section is edited
+PAGETREE_CUSTOM_CACHE_CLEAR = clear_hierarchy_metadata
@@ -10,8 +10,11 @@ from django.contrib.auth.views import password_change, password_change_done, \
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.generic import TemplateView
 
-from videoanalytics.main.views import IndexView, ReportView, \
-    RestrictedEditView, RestrictedPageView, TrackVideoView, VideoPageView
+from videoanalytics.main.views import IndexView, ParticipantReportView, \
+    ReorderAnswersView, ReorderQuestionsView, ReportJobDetailView, \
+    ReportJobDownloadView, ReportJobView, ReportView, RetentionView, \
+    RestrictedEditView, RestrictedPageView, TrackVideoBatchView, \
+    TrackVideoView, VideoPageView
 
 
 admin.autodiscover()
@@ -62,10 +65,24 @@ urlpatterns = [
     url(r'^stats/$', TemplateView.as_view(template_name="stats.html")),
     url(r'smoketest/', include('smoketest.urls')),
     url(r'^pagetree/', include('pagetree.urls')),
+    url(r'^quizblock/reorder_answers/(?P<pk>\d+)/$',
+        ReorderAnswersView.as_view(), {}, 'reorder-answer'),
+    url(r'^quizblock/reorder_questions/(?P<pk>\d+)/$',
+        ReorderQuestionsView.as_view(), {}, 'reorder-questions'),
     url(r'^quizblock/', include('quizblock.urls')),
 
     url(r'^report/$', ReportView.as_view(), {}, 'report-view'),
+    url(r'^report/participants/$', ParticipantReportView.as_view(), {},
+        'report-participants-view'),
+    url(r'^report/retention/$', RetentionView.as_view(), {},
+        'retention-view'),
+    url(r'^report/jobs/$', ReportJobView.as_view(), {}, 'report-jobs-view'),
+    url(r'^report/jobs/(?P<pk>\d+)/$', ReportJobDetailView.as_view(), {},
+        'report-job-view'),
+    url(r'^report/jobs/(?P<pk>\d+)/download/$',
+        ReportJobDownloadView.as_view(), {}, 'report-job-download'),
     url(r'^track/$', TrackVideoView.as_view()),
+    url(r'^track/batch/$', TrackVideoBatchView.as_view()),
 
     # Group One
     url(r'^pages/a/edit/(?P<path>.*)$', RestrictedEditView.as_view(